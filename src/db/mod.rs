@@ -1,6 +1,7 @@
 pub mod repositories;
 
 use std::path::Path;
+use std::sync::Arc;
 use std::time::Instant;
 
 #[cfg(feature = "staging")]
@@ -18,6 +19,7 @@ use sqlx::postgres::{PgConnectOptions, PgPoolOptions};
 use sqlx::{ConnectOptions, PgPool};
 
 use crate::config::Settings;
+use repositories::influencer_repository::{InfluencerCache, new_influencer_cache};
 
 pub struct HealthCheckResult {
     pub status: String,
@@ -33,6 +35,7 @@ pub struct HealthCheckResult {
 pub struct Database {
     pub pool: SqlitePool,
     pub db_path: String,
+    influencer_cache: Arc<InfluencerCache>,
 }
 
 #[cfg(feature = "staging")]
@@ -78,7 +81,11 @@ impl Database {
             "Connected to SQLite database"
         );
 
-        Ok(Self { pool, db_path })
+        Ok(Self {
+            pool,
+            db_path,
+            influencer_cache: Arc::new(new_influencer_cache()),
+        })
     }
 
     pub fn conv_repo(&self) -> repositories::ConversationRepository {
@@ -90,7 +97,7 @@ impl Database {
     }
 
     pub fn inf_repo(&self) -> repositories::InfluencerRepository {
-        repositories::InfluencerRepository::new(self.pool.clone())
+        repositories::InfluencerRepository::new(self.pool.clone(), self.influencer_cache.clone())
     }
 
     pub async fn run_checkpoint(&self) {
@@ -174,6 +181,7 @@ impl Database {
 #[derive(Clone)]
 pub struct Database {
     pub pg_pool: PgPool,
+    influencer_cache: Arc<InfluencerCache>,
 }
 
 #[cfg(not(feature = "staging"))]
@@ -200,7 +208,10 @@ impl Database {
 
         tracing::info!(pool_size = settings.pg_pool_size, "Connected to PostgreSQL");
 
-        Ok(Self { pg_pool })
+        Ok(Self {
+            pg_pool,
+            influencer_cache: Arc::new(new_influencer_cache()),
+        })
     }
 
     pub fn conv_repo(&self) -> repositories::ConversationRepository {
@@ -212,7 +223,10 @@ impl Database {
     }
 
     pub fn inf_repo(&self) -> repositories::InfluencerRepository {
-        repositories::InfluencerRepository::new(self.pg_pool.clone())
+        repositories::InfluencerRepository::new(
+            self.pg_pool.clone(),
+            self.influencer_cache.clone(),
+        )
     }
 
     pub async fn health_check(&self) -> HealthCheckResult {
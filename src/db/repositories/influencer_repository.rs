@@ -1,3 +1,6 @@
+use std::sync::Arc;
+use std::time::Duration;
+
 #[cfg(not(feature = "staging"))]
 use sqlx::PgPool;
 #[cfg(feature = "staging")]
@@ -7,12 +10,22 @@ use sqlx::SqlitePool;
 use super::{parse_dt, parse_json};
 
 use crate::models::entities::{AIInfluencer, InfluencerStatus};
+use crate::services::cache::TtlCache;
+
+/// Shared by-id influencer cache. Single rows are invalidated on every write
+/// made through the repository; the TTL bounds staleness for out-of-band edits.
+pub type InfluencerCache = TtlCache<String, AIInfluencer>;
+
+pub fn new_influencer_cache() -> InfluencerCache {
+    TtlCache::new(Duration::from_secs(120), 1024)
+}
 
 // ── Staging: SQLite-only ──────────────────────────────────────────────────────
 
 #[cfg(feature = "staging")]
 pub struct InfluencerRepository {
     pool: SqlitePool,
+    cache: Arc<InfluencerCache>,
 }
 
 #[cfg(feature = "staging")]
@@ -39,6 +52,9 @@ struct InfluencerRow {
     conversation_count: Option<i64>,
     #[sqlx(default)]
     message_count: Option<i64>,
+    /// Full result-set size from `COUNT(*) OVER()` on paginated list queries.
+    #[sqlx(default)]
+    total_count: Option<i64>,
 }
 
 #[cfg(feature = "staging")]
@@ -76,8 +92,8 @@ const SELECT_COLS: &str =
 
 #[cfg(feature = "staging")]
 impl InfluencerRepository {
-    pub fn new(pool: SqlitePool) -> Self {
-        Self { pool }
+    pub fn new(pool: SqlitePool, cache: Arc<InfluencerCache>) -> Self {
+        Self { pool, cache }
     }
 
     // ── Writes ────────────────────────────────────────────────────────────────
@@ -142,6 +158,7 @@ impl InfluencerRepository {
         .bind(influencer_id)
         .execute(&self.pool)
         .await?;
+        self.cache.invalidate(influencer_id);
         Ok(())
     }
 
@@ -152,6 +169,7 @@ impl InfluencerRepository {
         .bind(influencer_id)
         .execute(&self.pool)
         .await?;
+        self.cache.invalidate(influencer_id);
         Ok(())
     }
 
@@ -162,6 +180,7 @@ impl InfluencerRepository {
         .bind(influencer_id)
         .execute(&self.pool)
         .await?;
+        self.cache.invalidate(influencer_id);
         Ok(())
     }
 
@@ -172,18 +191,21 @@ impl InfluencerRepository {
         .bind(influencer_id)
         .execute(&self.pool)
         .await?;
+        self.cache.invalidate(influencer_id);
         Ok(())
     }
 
     // ── Reads ─────────────────────────────────────────────────────────────────
 
-    pub async fn list_all(
+    /// One page of listable influencers plus the total count, in one query.
+    pub async fn list_all_with_total(
         &self,
         limit: i64,
         offset: i64,
-    ) -> Result<Vec<AIInfluencer>, sqlx::Error> {
+    ) -> Result<(Vec<AIInfluencer>, i64), sqlx::Error> {
         let rows = sqlx::query_as::<_, InfluencerRow>(&format!(
-            "SELECT {SELECT_COLS} FROM ai_influencers WHERE is_active != 'discontinued'
+            "SELECT {SELECT_COLS}, COUNT(*) OVER() as total_count
+             FROM ai_influencers WHERE is_active != 'discontinued'
              ORDER BY CASE is_active WHEN 'active' THEN 1 WHEN 'coming_soon' THEN 2 END, created_at DESC
              LIMIT ? OFFSET ?"
         ))
@@ -191,20 +213,33 @@ impl InfluencerRepository {
         .bind(offset)
         .fetch_all(&self.pool)
         .await?;
-        Ok(rows.into_iter().map(AIInfluencer::from).collect())
-    }
-
+        let total = match rows.first() {
+            Some(row) => row.total_count.unwrap_or(0),
+            // Past the last page the window count is not available
+            None if offset > 0 => self.count_all().await?,
+            None => 0,
+        };
+        Ok((rows.into_iter().map(AIInfluencer::from).collect(), total))
+    }
+
+    /// Served from the in-process influencer cache when possible (one DB load
+    /// per id on concurrent misses); writes through this repository invalidate
+    /// the affected id.
     pub async fn get_by_id(
         &self,
         influencer_id: &str,
     ) -> Result<Option<AIInfluencer>, sqlx::Error> {
-        let row = sqlx::query_as::<_, InfluencerRow>(&format!(
-            "SELECT {SELECT_COLS} FROM ai_influencers WHERE id = ?"
-        ))
-        .bind(influencer_id)
-        .fetch_optional(&self.pool)
-        .await?;
-        Ok(row.map(AIInfluencer::from))
+        self.cache
+            .get_or_try_insert_with(influencer_id, || async {
+                let row = sqlx::query_as::<_, InfluencerRow>(&format!(
+                    "SELECT {SELECT_COLS} FROM ai_influencers WHERE id = ?"
+                ))
+                .bind(influencer_id)
+                .fetch_optional(&self.pool)
+                .await?;
+                Ok::<_, sqlx::Error>(row.map(AIInfluencer::from))
+            })
+            .await
     }
 
     pub async fn get_by_name(&self, name: &str) -> Result<Option<AIInfluencer>, sqlx::Error> {
@@ -231,16 +266,17 @@ impl InfluencerRepository {
         Ok(row.map(AIInfluencer::from))
     }
 
+    /// Resolved through the cached influencer row: access checks run right
+    /// before the full influencer is loaded, so this warms the cache for it.
     pub async fn get_parent_principal(
         &self,
         influencer_id: &str,
     ) -> Result<Option<String>, sqlx::Error> {
-        let row: Option<(Option<String>,)> =
-            sqlx::query_as("SELECT parent_principal_id FROM ai_influencers WHERE id = ?")
-                .bind(influencer_id)
-                .fetch_optional(&self.pool)
-                .await?;
-        Ok(row.and_then(|r| r.0).filter(|s| !s.is_empty()))
+        Ok(self
+            .get_by_id(influencer_id)
+            .await?
+            .and_then(|i| i.parent_principal_id)
+            .filter(|s| !s.is_empty()))
     }
 
     pub async fn get_with_conversation_count(
@@ -264,11 +300,12 @@ impl InfluencerRepository {
         Ok(row.map(AIInfluencer::from))
     }
 
-    pub async fn list_trending(
+    /// One page of trending influencers plus the total count, in one query.
+    pub async fn list_trending_with_total(
         &self,
         limit: i64,
         offset: i64,
-    ) -> Result<Vec<AIInfluencer>, sqlx::Error> {
+    ) -> Result<(Vec<AIInfluencer>, i64), sqlx::Error> {
         let rows = sqlx::query_as::<_, InfluencerRow>(
             "SELECT i.id, i.name, i.display_name, i.avatar_url, i.description,
                     i.category, i.system_instructions, i.personality_traits,
@@ -276,7 +313,8 @@ impl InfluencerRepository {
                     i.is_active, i.is_nsfw, i.parent_principal_id, i.source,
                     i.created_at, i.updated_at, i.metadata,
                     (SELECT COUNT(c.id) FROM conversations c WHERE c.influencer_id = i.id) as conversation_count,
-                    (SELECT COUNT(m.id) FROM conversations c JOIN messages m ON c.id = m.conversation_id WHERE c.influencer_id = i.id AND m.role = 'user') as message_count
+                    (SELECT COUNT(m.id) FROM conversations c JOIN messages m ON c.id = m.conversation_id WHERE c.influencer_id = i.id AND m.role = 'user') as message_count,
+                    COUNT(*) OVER() as total_count
              FROM ai_influencers i WHERE i.is_active = 'active'
              ORDER BY message_count DESC, i.created_at DESC LIMIT ? OFFSET ?",
         )
@@ -284,7 +322,12 @@ impl InfluencerRepository {
         .bind(offset)
         .fetch_all(&self.pool)
         .await?;
-        Ok(rows.into_iter().map(AIInfluencer::from).collect())
+        let total = match rows.first() {
+            Some(row) => row.total_count.unwrap_or(0),
+            None if offset > 0 => self.count_trending().await?,
+            None => 0,
+        };
+        Ok((rows.into_iter().map(AIInfluencer::from).collect(), total))
     }
 
     pub async fn count_trending(&self) -> Result<i64, sqlx::Error> {
@@ -309,6 +352,7 @@ impl InfluencerRepository {
 #[cfg(not(feature = "staging"))]
 pub struct InfluencerRepository {
     pg_pool: PgPool,
+    cache: Arc<InfluencerCache>,
 }
 
 #[cfg(not(feature = "staging"))]
@@ -335,6 +379,9 @@ struct PgInfluencerRow {
     conversation_count: Option<i64>,
     #[sqlx(default)]
     message_count: Option<i64>,
+    /// Full result-set size from `COUNT(*) OVER()` on paginated list queries.
+    #[sqlx(default)]
+    total_count: Option<i64>,
 }
 
 #[cfg(not(feature = "staging"))]
@@ -372,8 +419,8 @@ const SELECT_COLS: &str =
 
 #[cfg(not(feature = "staging"))]
 impl InfluencerRepository {
-    pub fn new(pg_pool: PgPool) -> Self {
-        Self { pg_pool }
+    pub fn new(pg_pool: PgPool, cache: Arc<InfluencerCache>) -> Self {
+        Self { pg_pool, cache }
     }
 
     // ── Writes ────────────────────────────────────────────────────────────────
@@ -423,6 +470,7 @@ impl InfluencerRepository {
         .bind(influencer_id)
         .execute(&self.pg_pool)
         .await?;
+        self.cache.invalidate(influencer_id);
         Ok(())
     }
 
@@ -433,6 +481,7 @@ impl InfluencerRepository {
         .bind(influencer_id)
         .execute(&self.pg_pool)
         .await?;
+        self.cache.invalidate(influencer_id);
         Ok(())
     }
 
@@ -443,6 +492,7 @@ impl InfluencerRepository {
         .bind(influencer_id)
         .execute(&self.pg_pool)
         .await?;
+        self.cache.invalidate(influencer_id);
         Ok(())
     }
 
@@ -453,18 +503,21 @@ impl InfluencerRepository {
         .bind(influencer_id)
         .execute(&self.pg_pool)
         .await?;
+        self.cache.invalidate(influencer_id);
         Ok(())
     }
 
     // ── Reads ─────────────────────────────────────────────────────────────────
 
-    pub async fn list_all(
+    /// One page of listable influencers plus the total count, in one query.
+    pub async fn list_all_with_total(
         &self,
         limit: i64,
         offset: i64,
-    ) -> Result<Vec<AIInfluencer>, sqlx::Error> {
+    ) -> Result<(Vec<AIInfluencer>, i64), sqlx::Error> {
         let rows = sqlx::query_as::<_, PgInfluencerRow>(&format!(
-            "SELECT {SELECT_COLS} FROM ai_influencers WHERE is_active != 'discontinued'
+            "SELECT {SELECT_COLS}, COUNT(*) OVER() as total_count
+             FROM ai_influencers WHERE is_active != 'discontinued'
              ORDER BY CASE is_active WHEN 'active' THEN 1 WHEN 'coming_soon' THEN 2 END, created_at DESC
              LIMIT $1 OFFSET $2"
         ))
@@ -472,20 +525,33 @@ impl InfluencerRepository {
         .bind(offset)
         .fetch_all(&self.pg_pool)
         .await?;
-        Ok(rows.into_iter().map(AIInfluencer::from).collect())
-    }
-
+        let total = match rows.first() {
+            Some(row) => row.total_count.unwrap_or(0),
+            // Past the last page the window count is not available
+            None if offset > 0 => self.count_all().await?,
+            None => 0,
+        };
+        Ok((rows.into_iter().map(AIInfluencer::from).collect(), total))
+    }
+
+    /// Served from the in-process influencer cache when possible (one DB load
+    /// per id on concurrent misses); writes through this repository invalidate
+    /// the affected id.
     pub async fn get_by_id(
         &self,
         influencer_id: &str,
     ) -> Result<Option<AIInfluencer>, sqlx::Error> {
-        let row = sqlx::query_as::<_, PgInfluencerRow>(&format!(
-            "SELECT {SELECT_COLS} FROM ai_influencers WHERE id = $1"
-        ))
-        .bind(influencer_id)
-        .fetch_optional(&self.pg_pool)
-        .await?;
-        Ok(row.map(AIInfluencer::from))
+        self.cache
+            .get_or_try_insert_with(influencer_id, || async {
+                let row = sqlx::query_as::<_, PgInfluencerRow>(&format!(
+                    "SELECT {SELECT_COLS} FROM ai_influencers WHERE id = $1"
+                ))
+                .bind(influencer_id)
+                .fetch_optional(&self.pg_pool)
+                .await?;
+                Ok::<_, sqlx::Error>(row.map(AIInfluencer::from))
+            })
+            .await
     }
 
     pub async fn get_by_name(&self, name: &str) -> Result<Option<AIInfluencer>, sqlx::Error> {
@@ -511,16 +577,17 @@ impl InfluencerRepository {
         Ok(row.map(AIInfluencer::from))
     }
 
+    /// Resolved through the cached influencer row: access checks run right
+    /// before the full influencer is loaded, so this warms the cache for it.
     pub async fn get_parent_principal(
         &self,
         influencer_id: &str,
     ) -> Result<Option<String>, sqlx::Error> {
-        let row: Option<(Option<String>,)> =
-            sqlx::query_as("SELECT parent_principal_id FROM ai_influencers WHERE id = $1")
-                .bind(influencer_id)
-                .fetch_optional(&self.pg_pool)
-                .await?;
-        Ok(row.and_then(|r| r.0).filter(|s| !s.is_empty()))
+        Ok(self
+            .get_by_id(influencer_id)
+            .await?
+            .and_then(|i| i.parent_principal_id)
+            .filter(|s| !s.is_empty()))
     }
 
     pub async fn get_with_conversation_count(
@@ -544,11 +611,12 @@ impl InfluencerRepository {
         Ok(row.map(AIInfluencer::from))
     }
 
-    pub async fn list_trending(
+    /// One page of trending influencers plus the total count, in one query.
+    pub async fn list_trending_with_total(
         &self,
         limit: i64,
         offset: i64,
-    ) -> Result<Vec<AIInfluencer>, sqlx::Error> {
+    ) -> Result<(Vec<AIInfluencer>, i64), sqlx::Error> {
         let rows = sqlx::query_as::<_, PgInfluencerRow>(
             "SELECT i.id, i.name, i.display_name, i.avatar_url, i.description,
                     i.category, i.system_instructions, i.personality_traits,
@@ -556,7 +624,8 @@ impl InfluencerRepository {
                     i.is_active, i.is_nsfw, i.parent_principal_id, i.source,
                     i.created_at, i.updated_at, i.metadata,
                     (SELECT COUNT(c.id) FROM conversations c WHERE c.influencer_id = i.id) as conversation_count,
-                    (SELECT COUNT(m.id) FROM conversations c JOIN messages m ON c.id = m.conversation_id WHERE c.influencer_id = i.id AND m.role = 'user') as message_count
+                    (SELECT COUNT(m.id) FROM conversations c JOIN messages m ON c.id = m.conversation_id WHERE c.influencer_id = i.id AND m.role = 'user') as message_count,
+                    COUNT(*) OVER() as total_count
              FROM ai_influencers i WHERE i.is_active = 'active'
              ORDER BY message_count DESC, i.created_at DESC LIMIT $1 OFFSET $2",
         )
@@ -564,7 +633,12 @@ impl InfluencerRepository {
         .bind(offset)
         .fetch_all(&self.pg_pool)
         .await?;
-        Ok(rows.into_iter().map(AIInfluencer::from).collect())
+        let total = match rows.first() {
+            Some(row) => row.total_count.unwrap_or(0),
+            None if offset > 0 => self.count_trending().await?,
+            None => 0,
+        };
+        Ok((rows.into_iter().map(AIInfluencer::from).collect(), total))
     }
 
     pub async fn count_trending(&self) -> Result<i64, sqlx::Error> {
@@ -583,3 +657,106 @@ impl InfluencerRepository {
         Ok(count.0)
     }
 }
+
+#[cfg(test)]
+mod tests {
+    use super::*;
+
+    /// Plain literals, so the same seed runs on SQLite and PostgreSQL. Active
+    /// a1..a3 (a1 has the most user messages), one coming_soon and one
+    /// discontinued influencer.
+    const SEED: &[&str] = &[
+        "DELETE FROM messages",
+        "DELETE FROM conversations",
+        "DELETE FROM ai_influencers",
+        "INSERT INTO ai_influencers (id, name, display_name, system_instructions, is_active, created_at)
+         VALUES ('a1', 'a1', 'A1', 'x', 'active', '2024-01-01 00:00:00'),
+                ('a2', 'a2', 'A2', 'x', 'active', '2024-01-02 00:00:00'),
+                ('a3', 'a3', 'A3', 'x', 'active', '2024-01-03 00:00:00'),
+                ('s1', 's1', 'S1', 'x', 'coming_soon', '2024-01-04 00:00:00'),
+                ('d1', 'd1', 'D1', 'x', 'discontinued', '2024-01-05 00:00:00')",
+        "INSERT INTO conversations (id, user_id, influencer_id) VALUES ('c1', 'u1', 'a1')",
+        "INSERT INTO messages (id, conversation_id, role, content, message_type)
+         VALUES ('m1', 'c1', 'user', 'hi', 'text'),
+                ('m2', 'c1', 'user', 'again', 'text'),
+                ('m3', 'c1', 'assistant', 'hello', 'text')",
+    ];
+
+    #[cfg(feature = "staging")]
+    async fn seeded_repo() -> Option<InfluencerRepository> {
+        // One connection, so every query sees the same in-memory database
+        let pool = sqlx::sqlite::SqlitePoolOptions::new()
+            .max_connections(1)
+            .connect("sqlite::memory:")
+            .await
+            .unwrap();
+        crate::db::run_migrations(
+            &pool,
+            concat!(env!("CARGO_MANIFEST_DIR"), "/migrations/sqlite"),
+        )
+        .await
+        .unwrap();
+        for sql in SEED {
+            sqlx::query(sql).execute(&pool).await.unwrap();
+        }
+        Some(InfluencerRepository::new(
+            pool,
+            Arc::new(new_influencer_cache()),
+        ))
+    }
+
+    /// Runs only against a disposable database named by TEST_DATABASE_URL,
+    /// since the seed deletes every influencer.
+    #[cfg(not(feature = "staging"))]
+    async fn seeded_repo() -> Option<InfluencerRepository> {
+        let url = std::env::var("TEST_DATABASE_URL").ok()?;
+        let pool = PgPool::connect(&url).await.unwrap();
+        crate::db::run_pg_migrations(
+            &pool,
+            concat!(env!("CARGO_MANIFEST_DIR"), "/migrations/postgres"),
+        )
+        .await
+        .unwrap();
+        for sql in SEED {
+            sqlx::query(sql).execute(&pool).await.unwrap();
+        }
+        Some(InfluencerRepository::new(
+            pool,
+            Arc::new(new_influencer_cache()),
+        ))
+    }
+
+    fn ids(page: &[AIInfluencer]) -> Vec<&str> {
+        page.iter().map(|i| i.id.as_str()).collect()
+    }
+
+    // A single test, so a shared PostgreSQL database is never seeded twice
+    // concurrently
+    #[tokio::test]
+    async fn paginated_lists_report_full_totals() {
+        let Some(repo) = seeded_repo().await else {
+            return;
+        };
+
+        // Page 1: active before coming_soon, newest first; discontinued hidden
+        let (page, total) = repo.list_all_with_total(2, 0).await.unwrap();
+        assert_eq!(ids(&page), ["a3", "a2"]);
+        assert_eq!(total, 4);
+
+        // Past the end there is no row to carry the window count
+        let (page, total) = repo.list_all_with_total(2, 10).await.unwrap();
+        assert!(page.is_empty());
+        assert_eq!(total, 4);
+
+        // Trending: active only, most user messages first
+        let (page, total) = repo.list_trending_with_total(10, 0).await.unwrap();
+        assert_eq!(ids(&page), ["a1", "a3", "a2"]);
+        assert_eq!(page[0].message_count, Some(2));
+        assert_eq!(page[0].conversation_count, Some(1));
+        assert_eq!(total, 3);
+
+        let (page, total) = repo.list_trending_with_total(2, 10).await.unwrap();
+        assert!(page.is_empty());
+        assert_eq!(total, 3);
+    }
+}
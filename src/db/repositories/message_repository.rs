@@ -236,9 +236,8 @@ impl MessageRepository {
         .bind(limit)
         .fetch_all(&self.pool)
         .await?;
-        let mut messages: Vec<Message> = rows.into_iter().map(Message::from).collect();
-        messages.reverse();
-        Ok(messages)
+        // Newest-first from the query; return oldest-first
+        Ok(rows.into_iter().rev().map(Message::from).collect())
     }
 
     pub async fn get_recent_for_conversations_batch(
@@ -529,9 +528,8 @@ impl MessageRepository {
         .bind(limit)
         .fetch_all(&self.pg_pool)
         .await?;
-        let mut messages: Vec<Message> = rows.into_iter().map(Message::from).collect();
-        messages.reverse();
-        Ok(messages)
+        // Newest-first from the query; return oldest-first
+        Ok(rows.into_iter().rev().map(Message::from).collect())
     }
 
     pub async fn get_recent_for_conversations_batch(
@@ -84,7 +84,7 @@ async fn main() {
     }
 
     // Build shared HTTP client
-    let http_client = reqwest::Client::new();
+    let http_client = build_http_client();
 
     // Build services
     let storage = StorageService::new(&settings, http_client.clone())
@@ -149,6 +149,11 @@ async fn main() {
         google_chat,
     });
 
+    // Prewarm connections to the AI providers and the metadata server
+    state.gemini.spawn_warmup();
+    state.openrouter.spawn_warmup();
+    state.push_notifications.spawn_warmup();
+
     // Start periodic WAL checkpoint (every 5 minutes) - staging only
     #[cfg(feature = "staging")]
     Database::spawn_periodic_checkpoint(state.db.pool.clone(), 300);
@@ -289,6 +294,14 @@ fn init_tracing(settings: &Settings) {
     }
 }
 
+/// Shared outbound HTTP client. One pool is reused by every service, so
+/// connections to Gemini, S3, Replicate and metadata stay warm between calls.
+fn build_http_client() -> reqwest::Client {
+    services::http::client_builder()
+        .build()
+        .expect("Failed to build HTTP client")
+}
+
 fn build_cors(settings: &Settings) -> CorsLayer {
     let origins = settings.cors_origins_list();
 
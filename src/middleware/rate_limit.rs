@@ -3,7 +3,7 @@ use std::sync::atomic::{AtomicU64, Ordering};
 use std::time::Instant;
 
 use axum::body::Body;
-use axum::http::{Request, Response, StatusCode};
+use axum::http::{HeaderValue, Request, Response, StatusCode};
 use axum::response::IntoResponse;
 use dashmap::DashMap;
 use tower::{Layer, Service};
@@ -80,9 +80,9 @@ impl RateLimitState {
         }
     }
 
-    fn get_or_create(&self, key: &str) -> dashmap::mapref::one::RefMut<'_, String, Buckets> {
+    fn get_or_create(&self, key: String) -> dashmap::mapref::one::RefMut<'_, String, Buckets> {
         self.buckets
-            .entry(key.to_string())
+            .entry(key)
             .or_insert_with(|| Buckets {
                 minute: TokenBucket::new(self.per_minute as f64, self.per_minute as f64 / 60.0),
                 hour: TokenBucket::new(self.per_hour as f64, self.per_hour as f64 / 3600.0),
@@ -158,10 +158,8 @@ where
     }
 
     fn call(&mut self, req: Request<Body>) -> Self::Future {
-        let path = req.uri().path().to_string();
-
         // Skip rate limiting for excluded paths
-        if EXCLUDED_PATHS.contains(&path.as_str()) {
+        if EXCLUDED_PATHS.contains(&req.uri().path()) {
             let mut inner = self.inner.clone();
             return Box::pin(async move { inner.call(req).await });
         }
@@ -181,7 +179,7 @@ where
         Box::pin(async move {
             state.cleanup();
 
-            let mut entry = state.get_or_create(&identifier);
+            let mut entry = state.get_or_create(identifier);
 
             // Check per-minute bucket
             if !entry.minute.consume() {
@@ -213,22 +211,13 @@ where
 
             // Add rate limit headers
             let headers = response.headers_mut();
-            headers.insert(
-                "X-RateLimit-Limit-Minute",
-                per_minute.to_string().parse().unwrap(),
-            );
-            headers.insert(
-                "X-RateLimit-Limit-Hour",
-                per_hour.to_string().parse().unwrap(),
-            );
+            headers.insert("X-RateLimit-Limit-Minute", HeaderValue::from(per_minute));
+            headers.insert("X-RateLimit-Limit-Hour", HeaderValue::from(per_hour));
             headers.insert(
                 "X-RateLimit-Remaining-Minute",
-                minute_remaining.to_string().parse().unwrap(),
-            );
-            headers.insert(
-                "X-RateLimit-Remaining-Hour",
-                hour_remaining.to_string().parse().unwrap(),
+                HeaderValue::from(minute_remaining),
             );
+            headers.insert("X-RateLimit-Remaining-Hour", HeaderValue::from(hour_remaining));
 
             Ok(response)
         })
@@ -247,7 +236,7 @@ fn rate_limit_response(retry_after: u64, limit_type: &str, limit: u32) -> Respon
     let mut resp = (StatusCode::TOO_MANY_REQUESTS, axum::Json(body)).into_response();
 
     resp.headers_mut()
-        .insert("Retry-After", retry_after.to_string().parse().unwrap());
+        .insert("Retry-After", HeaderValue::from(retry_after));
 
     resp
 }
@@ -38,7 +38,9 @@ impl SendMessageRequest {
         self.message_type.parse().ok()
     }
 
-    pub fn validate_content(&self) -> Result<(), String> {
+    /// Validate the body against its message type and return the parsed type,
+    /// so callers do not parse it a second time.
+    pub fn validate_content(&self) -> Result<MessageType, String> {
         let msg_type = self.parsed_message_type().ok_or("Invalid message type")?;
         let content = self.content.as_deref().unwrap_or("").trim();
         let media_urls = self.media_urls.as_deref().unwrap_or(&[]);
@@ -72,7 +74,7 @@ impl SendMessageRequest {
             }
         }
 
-        Ok(())
+        Ok(msg_type)
     }
 }
 
@@ -1,4 +1,6 @@
+use std::borrow::Cow;
 use std::collections::HashMap;
+use std::fmt::Write;
 use std::sync::Arc;
 
 use axum::Json;
@@ -19,10 +21,57 @@ use crate::models::responses::{
     ListConversationsResponse, ListMessagesResponse, MarkConversationAsReadResponse,
     MessageResponse, SendMessageResponse,
 };
+use crate::services::ai::AiClient;
 
 const FALLBACK_ERROR_MESSAGE: &str =
     "I'm having trouble generating a response right now. Please try again.";
 
+/// Append conversation memories to the persona instructions.
+/// Borrows the persona prompt unchanged when there is nothing to add, so the
+/// common no-memories path does not copy the (often multi-KB) instructions.
+fn with_memories<'a>(instructions: &'a str, memories: &HashMap<String, String>) -> Cow<'a, str> {
+    if memories.is_empty() {
+        return Cow::Borrowed(instructions);
+    }
+    let extra: usize = memories.iter().map(|(k, v)| k.len() + v.len() + 5).sum();
+    let mut out = String::with_capacity(instructions.len() + 16 + extra);
+    out.push_str(instructions);
+    out.push_str("\n\n**MEMORIES:**\n");
+    for (key, value) in memories {
+        let _ = writeln!(out, "- {key}: {value}");
+    }
+    Cow::Owned(out)
+}
+
+/// Pick the AI provider for an influencer: NSFW bots go to OpenRouter when it
+/// is configured, everything else to Gemini.
+fn ai_client_for<'a>(state: &'a AppState, influencer: &AIInfluencer) -> &'a AiClient {
+    if influencer.is_nsfw && state.openrouter.is_configured() {
+        &state.openrouter
+    } else {
+        &state.gemini
+    }
+}
+
+/// Look up a retried send by its client message id. Returns the stored user
+/// message and its reply only if the earlier attempt was fully answered.
+async fn find_answered_duplicate(
+    msg_repo: &MessageRepository,
+    conversation_id: &str,
+    client_message_id: Option<&str>,
+) -> Result<Option<(Message, Message)>, AppError> {
+    let Some(client_id) = client_message_id else {
+        return Ok(None);
+    };
+    let Some(existing) = msg_repo.get_by_client_id(conversation_id, client_id).await? else {
+        return Ok(None);
+    };
+    Ok(msg_repo
+        .get_assistant_reply(&existing.id)
+        .await?
+        .map(|reply| (existing, reply)))
+}
+
 /// Check if a user can access a conversation.
 /// Allowed if they are the user, the bot, or the bot's parent (owner).
 async fn can_access_conversation(
@@ -129,23 +178,20 @@ pub async fn create_conversation(
     let inf_repo = state.db.inf_repo();
     let msg_repo = state.db.msg_repo();
 
-    // Verify influencer exists
-    let influencer = inf_repo
-        .get_by_id(&body.influencer_id)
-        .await?
-        .ok_or_else(|| {
-            AppError::not_found(format!("Influencer '{}' not found", body.influencer_id))
-        })?;
+    // Verify influencer exists and check for an existing conversation concurrently
+    let (influencer, existing) = tokio::try_join!(
+        inf_repo.get_by_id(&body.influencer_id),
+        conv_repo.get_existing(&user.user_id, &body.influencer_id),
+    )?;
+    let influencer = influencer.ok_or_else(|| {
+        AppError::not_found(format!("Influencer '{}' not found", body.influencer_id))
+    })?;
 
-    // Check for existing conversation
-    if let Some(existing) = conv_repo
-        .get_existing(&user.user_id, &body.influencer_id)
-        .await?
-    {
-        let count = msg_repo.count_by_conversation(&existing.id).await?;
-        let messages = msg_repo
-            .list_by_conversation(&existing.id, 10, 0, "desc")
-            .await?;
+    if let Some(existing) = existing {
+        let (count, messages) = tokio::try_join!(
+            msg_repo.count_by_conversation(&existing.id),
+            msg_repo.list_by_conversation(&existing.id, 10, 0, "desc"),
+        )?;
 
         let mut conv = existing;
         conv.message_count = Some(count);
@@ -324,12 +370,9 @@ pub async fn send_message(
     let inf_repo = state.db.inf_repo();
 
     // Validate
-    body.validate_content()
-        .map_err(AppError::validation_error)?;
-
     let message_type = body
-        .parsed_message_type()
-        .ok_or_else(|| AppError::validation_error("Invalid message type"))?;
+        .validate_content()
+        .map_err(AppError::validation_error)?;
 
     // Verify conversation
     let conv = conv_repo
@@ -341,13 +384,24 @@ pub async fn send_message(
         return Err(AppError::forbidden("Not your conversation"));
     }
 
+    // Deduplication lookup and influencer load are independent; run them
+    // concurrently once access is confirmed
+    let (duplicate, influencer) = tokio::try_join!(
+        find_answered_duplicate(
+            &msg_repo,
+            &conversation_id,
+            body.client_message_id.as_deref()
+        ),
+        async {
+            inf_repo
+                .get_by_id(&conv.influencer_id)
+                .await
+                .map_err(AppError::from)
+        },
+    )?;
+
     // Deduplication
-    if let Some(ref client_id) = body.client_message_id
-        && let Some(existing) = msg_repo
-            .get_by_client_id(&conversation_id, client_id)
-            .await?
-        && let Some(reply) = msg_repo.get_assistant_reply(&existing.id).await?
-    {
+    if let Some((existing, reply)) = duplicate {
         return Ok((
             StatusCode::OK,
             Json(SendMessageResponse {
@@ -357,10 +411,7 @@ pub async fn send_message(
         ));
     }
 
-    let influencer = inf_repo
-        .get_by_id(&conv.influencer_id)
-        .await?
-        .ok_or_else(|| AppError::not_found("Influencer not found"))?;
+    let influencer = influencer.ok_or_else(|| AppError::not_found("Influencer not found"))?;
 
     // Check if bot is discontinued
     if influencer.is_active == InfluencerStatus::Discontinued {
@@ -370,23 +421,42 @@ pub async fn send_message(
     }
 
     // Transcribe audio if needed
-    let transcribed_content = if message_type == MessageType::Audio {
-        if let Some(ref audio_key) = body.audio_url {
-            let presigned = state.storage.generate_presigned_url(audio_key).await;
-            match state.gemini.transcribe_audio(&presigned).await {
-                Ok(text) => Some(format!("[Transcribed: {text}]")),
-                Err(e) => {
-                    tracing::error!(error = %e, "Audio transcription failed");
-                    Some("[Audio message - transcription unavailable]".to_string())
+    let transcription = async {
+        if message_type == MessageType::Audio {
+            if let Some(ref audio_key) = body.audio_url {
+                let presigned = state.storage.generate_presigned_url(audio_key).await;
+                // Only our own storage keys are stable enough to cache on
+                let object_key = (!audio_key.starts_with("http://")
+                    && !audio_key.starts_with("https://"))
+                .then_some(audio_key.as_str());
+                let max_bytes = state.settings.max_audio_size_bytes();
+                match state
+                    .gemini
+                    .transcribe_audio(object_key, &presigned, max_bytes)
+                    .await
+                {
+                    Ok(text) => Some(format!("[Transcribed: {text}]")),
+                    Err(e) => {
+                        tracing::error!(error = %e, "Audio transcription failed");
+                        Some("[Audio message - transcription unavailable]".to_string())
+                    }
                 }
+            } else {
+                body.content.clone()
             }
         } else {
             body.content.clone()
         }
-    } else {
-        body.content.clone()
     };
 
+    // Load recent history (last 10 plus room for the current message) while
+    // any transcription is in flight
+    let (transcribed_content, all_recent) = tokio::join!(
+        transcription,
+        msg_repo.get_recent_for_context(&conversation_id, 11)
+    );
+    let all_recent = all_recent?;
+
     // Save user message
     let user_message = msg_repo
         .create(
@@ -402,27 +472,26 @@ pub async fn send_message(
         )
         .await?;
 
-    // Get conversation history (last 10 excluding current message)
-    let all_recent = msg_repo
-        .get_recent_for_context(&conversation_id, 11)
-        .await?;
-    let mut history: Vec<Message> = all_recent
-        .into_iter()
-        .filter(|m| m.id != user_message.id)
-        .collect();
+    // Conversation history: last 10 excluding current message (a retried
+    // client_message_id can return an already-stored message)
+    let mut history = all_recent;
+    history.retain(|m| m.id != user_message.id);
     let skip = history.len().saturating_sub(10);
     history.drain(..skip);
 
-    // Presign S3 keys in history
+    // Presign S3 keys in history and current media in one batch
+    let current_media: &[String] =
+        if matches!(message_type, MessageType::Image | MessageType::Multimodal) {
+            body.media_urls.as_deref().unwrap_or(&[])
+        } else {
+            &[]
+        };
     let s3_keys: Vec<String> = history
         .iter()
-        .flat_map(|m| {
-            m.media_urls
-                .iter()
-                .chain(m.audio_url.iter())
-                .filter(|u| !u.starts_with("http"))
-                .cloned()
-        })
+        .flat_map(|m| m.media_urls.iter().chain(m.audio_url.iter()))
+        .chain(current_media.iter())
+        .filter(|u| !u.starts_with("http"))
+        .cloned()
         .collect();
     let url_map = if s3_keys.is_empty() {
         HashMap::new()
@@ -434,6 +503,8 @@ pub async fn send_message(
         msg.media_urls = msg.media_urls.iter().map(|u| presign(u)).collect();
         msg.audio_url = msg.audio_url.as_ref().map(|u| presign(u));
     }
+    let media_urls_for_ai: Option<Vec<String>> = (!current_media.is_empty())
+        .then(|| current_media.iter().map(|u| presign(u)).collect());
 
     // Enhance system instructions with memories
     let memories: HashMap<String, String> = conv
@@ -442,30 +513,7 @@ pub async fn send_message(
         .and_then(|m| serde_json::from_value(m.clone()).ok())
         .unwrap_or_default();
 
-    let mut enhanced_instructions = influencer.system_instructions.clone();
-    if !memories.is_empty() {
-        enhanced_instructions.push_str("\n\n**MEMORIES:**\n");
-        for (key, value) in &memories {
-            enhanced_instructions.push_str(&format!("- {key}: {value}\n"));
-        }
-    }
-
-    // Presign current media URLs for AI
-    let media_urls_for_ai: Option<Vec<String>> =
-        if matches!(message_type, MessageType::Image | MessageType::Multimodal) {
-            if let Some(urls) = body.media_urls.as_ref() {
-                let batch = state.storage.generate_presigned_urls_batch(urls).await;
-                Some(
-                    urls.iter()
-                        .map(|u| batch.get(u).cloned().unwrap_or_else(|| u.clone()))
-                        .collect(),
-                )
-            } else {
-                None
-            }
-        } else {
-            None
-        };
+    let enhanced_instructions = with_memories(&influencer.system_instructions, &memories);
 
     // Select AI client and generate response
     let ai_input = transcribed_content
@@ -481,28 +529,17 @@ pub async fn send_message(
         true,
     );
 
+    let ai_client = ai_client_for(&state, &influencer);
+
     // AI generation with fallback error handling
-    let ai_result = if influencer.is_nsfw && state.openrouter.is_configured() {
-        state
-            .openrouter
-            .generate_response(
-                ai_input,
-                &enhanced_instructions,
-                &history,
-                media_urls_for_ai.as_deref(),
-            )
-            .await
-    } else {
-        state
-            .gemini
-            .generate_response(
-                ai_input,
-                &enhanced_instructions,
-                &history,
-                media_urls_for_ai.as_deref(),
-            )
-            .await
-    };
+    let ai_result = ai_client
+        .generate_response(
+            ai_input,
+            &enhanced_instructions,
+            history,
+            media_urls_for_ai.as_deref(),
+        )
+        .await;
 
     // Broadcast typing indicator: STOP
     state.ws_manager.broadcast_typing_status(
@@ -538,11 +575,11 @@ pub async fn send_message(
     // Background tasks: memory extraction + notifications
     spawn_memory_extraction(
         &state,
+        ai_client,
         &conversation_id,
         ai_input,
         &response_text,
         &memories,
-        influencer.is_nsfw,
     );
     spawn_notifications(
         &state,
@@ -560,11 +597,11 @@ pub async fn send_message(
         StatusCode::OK
     };
 
-    // Presign media URLs in response messages so clients get usable URLs
+    // Presign media URLs in the user message so clients get usable URLs.
+    // The assistant reply is always plain text, so there is nothing to sign.
     let mut user_resp = MessageResponse::from(user_message);
-    let mut asst_resp = MessageResponse::from(assistant_message);
+    let asst_resp = MessageResponse::from(assistant_message);
     presign_message_urls(&state.storage, &mut user_resp).await;
-    presign_message_urls(&state.storage, &mut asst_resp).await;
 
     Ok((
         status,
@@ -765,7 +802,7 @@ async fn generate_image_prompt_from_context(
         .generate_response(
             &format!("Conversation Context:\n{context_str}\n\nGenerate an image prompt:"),
             "You are an AI assistant helping to visualize a scene. Based on the recent conversation, generate a detailed image generation prompt that captures the current context, action, or requested visual. Output ONLY the prompt, no other text.",
-            &[],
+            Vec::new(),
             None,
         )
         .await?;
@@ -846,30 +883,23 @@ async fn presign_message_urls(
 
 fn spawn_memory_extraction(
     state: &Arc<AppState>,
+    ai_client: &AiClient,
     conversation_id: &str,
     user_input: &str,
     response_text: &str,
     memories: &HashMap<String, String>,
-    is_nsfw: bool,
 ) {
     let db = state.db.clone();
     let conv_id = conversation_id.to_string();
     let ai_input = user_input.to_string();
     let response = response_text.to_string();
     let memories = memories.clone();
-    let gemini = state.gemini.clone();
-    let openrouter = state.openrouter.clone();
+    let ai_client = ai_client.clone();
 
     tokio::spawn(async move {
-        let result = if is_nsfw && openrouter.is_configured() {
-            openrouter
-                .extract_memories(&ai_input, &response, &memories)
-                .await
-        } else {
-            gemini
-                .extract_memories(&ai_input, &response, &memories)
-                .await
-        };
+        let result = ai_client
+            .extract_memories(&ai_input, &response, &memories)
+            .await;
 
         match result {
             Ok(updated) if updated != memories => {
@@ -904,8 +934,7 @@ fn spawn_notifications(
     let influencer_name = influencer.display_name.clone();
     let influencer_avatar = influencer.avatar_url.clone();
     let msg_content = response_text.to_string();
-    let msg_json =
-        serde_json::to_value(MessageResponse::from(assistant_message.clone())).unwrap_or_default();
+    let message = MessageResponse::from(assistant_message.clone());
 
     tokio::spawn(async move {
         let unread_count = db.msg_repo().count_unread(&conv_id).await.unwrap_or(0);
@@ -919,23 +948,20 @@ fn spawn_notifications(
         ws.broadcast_new_message(
             &user_id,
             &conv_id,
-            &msg_json,
+            &message,
             &influencer_json,
             unread_count,
         );
 
-        let truncated = if msg_content.chars().count() > 100 {
-            let s: String = msg_content.chars().take(100).collect();
-            format!("{s}...")
-        } else {
-            msg_content
+        let truncated = match msg_content.char_indices().nth(100) {
+            Some((cut, _)) => format!("{}...", &msg_content[..cut]),
+            None => msg_content,
         };
         let data = serde_json::json!({
             "conversation_id": conv_id,
             "influencer_id": influencer_id,
             "type": "new_message",
         });
-        push.send_push_notification(&user_id, &influencer_name, &truncated, Some(&data))
-            .await;
+        push.send_push_notification(user_id, influencer_name, truncated, Some(data));
     });
 }
@@ -3,6 +3,7 @@ use std::sync::Arc;
 
 use axum::Json;
 use axum::extract::{Query, State};
+use serde::{Deserialize, Serialize};
 
 use crate::AppState;
 use crate::db::repositories::ConversationRepository;
@@ -105,6 +106,32 @@ async fn batch_fetch_user_profiles(
     profiles
 }
 
+#[derive(Serialize)]
+struct MetadataBulkRequest<'a> {
+    users: &'a [String],
+}
+
+/// Only the fields we read; decoded directly instead of via a Value tree.
+#[derive(Deserialize)]
+struct MetadataBulkResponse {
+    #[serde(rename = "Ok")]
+    ok: Option<HashMap<String, MetadataEntry>>,
+}
+
+/// Entries that do not match `UserMetadata` (null, or a non-string
+/// `user_name`) are skipped instead of failing the whole batch.
+#[derive(Deserialize)]
+#[serde(untagged)]
+enum MetadataEntry {
+    Known(UserMetadata),
+    Unreadable(serde::de::IgnoredAny),
+}
+
+#[derive(Deserialize)]
+struct UserMetadata {
+    user_name: Option<String>,
+}
+
 /// Fetch usernames from the yral metadata server via POST /metadata-bulk.
 async fn fetch_usernames_from_metadata(
     http_client: &reqwest::Client,
@@ -113,7 +140,7 @@ async fn fetch_usernames_from_metadata(
 ) -> HashMap<String, String> {
     let url = format!("{}/metadata-bulk", metadata_url.trim_end_matches('/'));
 
-    let body = serde_json::json!({ "users": user_ids });
+    let body = MetadataBulkRequest { users: user_ids };
 
     let result: HashMap<String, String> = match http_client.post(&url).json(&body).send().await {
         Ok(resp) => {
@@ -121,20 +148,19 @@ async fn fetch_usernames_from_metadata(
                 tracing::warn!(status = %resp.status(), "Metadata server returned error for bulk fetch");
                 return HashMap::new();
             }
-            match resp.json::<serde_json::Value>().await {
-                Ok(json) => {
-                    let mut usernames = HashMap::new();
-                    if let Some(ok_data) = json.get("Ok").and_then(|v| v.as_object()) {
-                        for (principal, meta) in ok_data {
-                            if let Some(name) = meta.get("user_name").and_then(|v| v.as_str())
-                                && !name.trim().is_empty()
-                            {
-                                usernames.insert(principal.clone(), name.to_string());
-                            }
-                        }
-                    }
-                    usernames
-                }
+            match resp.json::<MetadataBulkResponse>().await {
+                Ok(json) => json
+                    .ok
+                    .unwrap_or_default()
+                    .into_iter()
+                    .filter_map(|(principal, entry)| {
+                        let MetadataEntry::Known(meta) = entry else {
+                            return None;
+                        };
+                        let name = meta.user_name?;
+                        (!name.trim().is_empty()).then_some((principal, name))
+                    })
+                    .collect(),
                 Err(e) => {
                     tracing::warn!(error = %e, "Failed to parse metadata bulk response");
                     HashMap::new()
@@ -3,6 +3,7 @@ use std::sync::Arc;
 use axum::Json;
 use axum::extract::{Path, Query, State};
 use axum::http::{HeaderMap, header};
+use serde::Deserialize;
 use validator::Validate;
 
 use crate::AppState;
@@ -44,6 +45,18 @@ async fn fetch_user_profile_pic(agent: &ic_agent::Agent, principal_id: &str) ->
     }
 }
 
+/// Only the fields we read from a metadata user-profile response.
+#[derive(Deserialize)]
+struct UserProfileResponse {
+    #[serde(rename = "Ok")]
+    ok: Option<UserProfile>,
+}
+
+#[derive(Deserialize)]
+struct UserProfile {
+    user_name: Option<String>,
+}
+
 /// Fetch username from metadata server for main user accounts
 async fn fetch_username_from_metadata(
     http_client: &reqwest::Client,
@@ -63,12 +76,8 @@ async fn fetch_username_from_metadata(
                 tracing::warn!(status = %resp.status(), "Metadata server returned error for user profile");
                 return None;
             }
-            match resp.json::<serde_json::Value>().await {
-                Ok(json) => json
-                    .get("Ok")
-                    .and_then(|v| v.get("user_name"))
-                    .and_then(|v| v.as_str())
-                    .map(|s| s.to_string()),
+            match resp.json::<UserProfileResponse>().await {
+                Ok(json) => json.ok.and_then(|profile| profile.user_name),
                 Err(e) => {
                     tracing::warn!(error = %e, "Failed to parse metadata user profile response");
                     None
@@ -105,6 +114,28 @@ impl From<AIInfluencer> for InfluencerResponse {
 
 type CachedJson<T> = ([(header::HeaderName, &'static str); 1], Json<T>);
 
+/// Cache-Control for public influencer reads, shared by every cached endpoint.
+const PUBLIC_CACHE_CONTROL: &str = "public, max-age=300";
+
+/// Check the X-Admin-Key header against the configured admin key.
+fn require_admin_key(state: &AppState, headers: &HeaderMap) -> Result<(), AppError> {
+    let provided_key = headers
+        .get("X-Admin-Key")
+        .and_then(|v| v.to_str().ok())
+        .unwrap_or("");
+
+    let valid = state
+        .settings
+        .admin_key_to_delete_influencer
+        .as_deref()
+        .is_some_and(|key| provided_key == key);
+
+    if !valid {
+        return Err(AppError::unauthorized("Invalid or missing admin key"));
+    }
+    Ok(())
+}
+
 /// List all influencers
 #[utoipa::path(
     get,
@@ -125,10 +156,10 @@ pub async fn list_influencers(
     let limit = params.limit(50, 100);
     let offset = params.offset();
 
-    let (influencers, total) = tokio::try_join!(repo.list_all(limit, offset), repo.count_all(),)?;
+    let (influencers, total) = repo.list_all_with_total(limit, offset).await?;
 
     Ok((
-        [(header::CACHE_CONTROL, "public, max-age=300")],
+        [(header::CACHE_CONTROL, PUBLIC_CACHE_CONTROL)],
         Json(ListInfluencersResponse {
             influencers: influencers
                 .into_iter()
@@ -161,8 +192,7 @@ pub async fn list_trending(
     let limit = params.limit(50, 100);
     let offset = params.offset();
 
-    let (influencers, total) =
-        tokio::try_join!(repo.list_trending(limit, offset), repo.count_trending(),)?;
+    let (influencers, total) = repo.list_trending_with_total(limit, offset).await?;
 
     let influencers = influencers
         .into_iter()
@@ -181,7 +211,7 @@ pub async fn list_trending(
         .collect();
 
     Ok((
-        [(header::CACHE_CONTROL, "public, max-age=300")],
+        [(header::CACHE_CONTROL, PUBLIC_CACHE_CONTROL)],
         Json(ListTrendingInfluencersResponse {
             influencers,
             total,
@@ -214,7 +244,7 @@ pub async fn get_influencer(
         .ok_or_else(|| AppError::not_found(format!("Influencer '{influencer_id}' not found")))?;
 
     Ok((
-        [(header::CACHE_CONTROL, "public, max-age=300")],
+        [(header::CACHE_CONTROL, PUBLIC_CACHE_CONTROL)],
         Json(InfluencerResponse::from(influencer)),
     ))
 }
@@ -576,20 +606,7 @@ pub async fn admin_ban_influencer(
     headers: HeaderMap,
     Path(influencer_id): Path<String>,
 ) -> Result<Json<InfluencerResponse>, AppError> {
-    let provided_key = headers
-        .get("X-Admin-Key")
-        .and_then(|v| v.to_str().ok())
-        .unwrap_or("");
-
-    let valid = state
-        .settings
-        .admin_key_to_delete_influencer
-        .as_deref()
-        .is_some_and(|key| provided_key == key);
-
-    if !valid {
-        return Err(AppError::unauthorized("Invalid or missing admin key"));
-    }
+    require_admin_key(&state, &headers)?;
 
     let repo = state.db.inf_repo();
 
@@ -601,15 +618,13 @@ pub async fn admin_ban_influencer(
     if let Err(e) = repo.ban(&influencer.id).await {
         state
             .google_chat
-            .notify_influencer_ban_failed(&influencer.id, &e.to_string())
-            .await;
+            .notify_influencer_ban_failed(&influencer.id, &e.to_string());
         return Err(e.into());
     }
 
     state
         .google_chat
-        .notify_influencer_banned(&influencer.id, &influencer.name)
-        .await;
+        .notify_influencer_banned(&influencer.id, &influencer.name);
 
     Ok(Json(InfluencerResponse::from(influencer)))
 }
@@ -631,20 +646,7 @@ pub async fn admin_unban_influencer(
     headers: HeaderMap,
     Path(influencer_id): Path<String>,
 ) -> Result<Json<InfluencerResponse>, AppError> {
-    let provided_key = headers
-        .get("X-Admin-Key")
-        .and_then(|v| v.to_str().ok())
-        .unwrap_or("");
-
-    let valid = state
-        .settings
-        .admin_key_to_delete_influencer
-        .as_deref()
-        .is_some_and(|key| provided_key == key);
-
-    if !valid {
-        return Err(AppError::unauthorized("Invalid or missing admin key"));
-    }
+    require_admin_key(&state, &headers)?;
 
     let repo = state.db.inf_repo();
 
@@ -656,15 +658,13 @@ pub async fn admin_unban_influencer(
     if let Err(e) = repo.unban(&influencer.id).await {
         state
             .google_chat
-            .notify_influencer_unban_failed(&influencer.id, &e.to_string())
-            .await;
+            .notify_influencer_unban_failed(&influencer.id, &e.to_string());
         return Err(e.into());
     }
 
     state
         .google_chat
-        .notify_influencer_unbanned(&influencer.id, &influencer.name)
-        .await;
+        .notify_influencer_unbanned(&influencer.id, &influencer.name);
 
     Ok(Json(InfluencerResponse::from(influencer)))
 }
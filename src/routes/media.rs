@@ -34,7 +34,7 @@ pub async fn upload_media(
     let mut content_type: Option<String> = None;
     let mut media_type: Option<String> = None;
 
-    while let Some(field) = multipart
+    while let Some(mut field) = multipart
         .next_field()
         .await
         .map_err(|e| AppError::bad_request(format!("Invalid multipart data: {e}")))?
@@ -44,13 +44,24 @@ pub async fn upload_media(
             "file" => {
                 file_name = field.file_name().map(|s| s.to_string());
                 content_type = field.content_type().map(|s| s.to_string());
-                file_bytes = Some(
-                    field
-                        .bytes()
-                        .await
-                        .map_err(|e| AppError::bad_request(format!("Failed to read file: {e}")))?
-                        .to_vec(),
-                );
+                // Read in chunks and stop as soon as the file exceeds every
+                // media limit, instead of buffering an oversized upload first
+                let limit = state.storage.max_upload_size_bytes();
+                let mut buf = Vec::new();
+                while let Some(chunk) = field
+                    .chunk()
+                    .await
+                    .map_err(|e| AppError::bad_request(format!("Failed to read file: {e}")))?
+                {
+                    if (buf.len() + chunk.len()) as u64 > limit {
+                        return Err(AppError::bad_request(format!(
+                            "File too large. Max: {}MB",
+                            limit / (1024 * 1024)
+                        )));
+                    }
+                    buf.extend_from_slice(&chunk);
+                }
+                file_bytes = Some(buf);
             }
             "type" => {
                 media_type = Some(
@@ -87,12 +98,12 @@ pub async fn upload_media(
     }
 
     // Determine content type
-    let ct = content_type.unwrap_or_else(|| mime_from_extension(&ext).to_string());
+    let ct = content_type.unwrap_or_else(|| mime_from_extension(ext).to_string());
 
     // Upload to S3
     let (storage_key, _) = state
         .storage
-        .upload(&user.user_id, file_bytes, &ext, &ct)
+        .upload(&user.user_id, file_bytes, ext, &ct)
         .await?;
 
     // Generate presigned URL for immediate access
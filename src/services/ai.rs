@@ -1,4 +1,7 @@
 use std::collections::HashMap;
+use std::io::Write;
+use std::sync::Arc;
+use std::time::Duration;
 
 use async_openai::Client;
 use async_openai::config::OpenAIConfig;
@@ -9,11 +12,33 @@ use async_openai::types::chat::{
     ChatCompletionRequestUserMessageContent, ChatCompletionRequestUserMessageContentPart,
     CreateChatCompletionRequestArgs, ImageUrl,
 };
-use base64::Engine;
-use serde::Deserialize;
+use base64::write::EncoderStringWriter;
+use reqwest::header::HeaderValue;
+use serde::{Deserialize, Serialize};
+use tokio::sync::Semaphore;
 
 use crate::error::AppError;
 use crate::models::entities::{Message, MessageRole};
+use crate::services::cache::TtlCache;
+
+const TRANSCRIPTION_CACHE_TTL: Duration = Duration::from_secs(300);
+/// In-flight completions per provider. Extra turns queue here instead of all
+/// hitting the provider at once and tripping its rate limit together.
+const MAX_CONCURRENT_COMPLETIONS: usize = 32;
+
+/// Retry policy for rate-limited chat completions. async-openai's default
+/// keeps retrying for up to 15 minutes; a chat turn should give up much
+/// sooner. A randomization factor of 1.0 spreads each wait over [0, 2x] so
+/// concurrent requests hitting the same 429 do not retry in lockstep.
+fn retry_backoff() -> backoff::ExponentialBackoff {
+    backoff::ExponentialBackoffBuilder::new()
+        .with_initial_interval(Duration::from_millis(250))
+        .with_randomization_factor(1.0)
+        .with_multiplier(2.0)
+        .with_max_interval(Duration::from_secs(4))
+        .with_max_elapsed_time(Some(Duration::from_secs(15)))
+        .build()
+}
 
 #[derive(Clone)]
 pub struct AiClient {
@@ -24,9 +49,16 @@ pub struct AiClient {
     configured: bool,
     provider: &'static str,
     // For Gemini transcription (native API, not OpenAI-compatible)
-    gemini_api_key: Option<String>,
-    gemini_model: Option<String>,
+    // Prebuilt x-goog-api-key header for the native Gemini endpoints
+    gemini_key_header: Option<HeaderValue>,
+    transcribe_url: Option<String>,
+    // OpenAI-compatible API root; also the connection warmup target
+    api_base: &'static str,
+    // Same pool as the completion client, so warmup connections are reused
     raw_http: reqwest::Client,
+    // Gemini only; the other providers cannot transcribe
+    transcriptions: Option<Arc<TtlCache<String, String>>>,
+    completion_permits: Arc<Semaphore>,
 }
 
 impl AiClient {
@@ -38,11 +70,14 @@ impl AiClient {
         temperature: f32,
         _timeout: u64,
     ) -> Self {
+        let api_base = "https://generativelanguage.googleapis.com/v1beta/openai";
         let config = OpenAIConfig::new()
             .with_api_key(api_key)
-            .with_api_base("https://generativelanguage.googleapis.com/v1beta/openai");
+            .with_api_base(api_base);
 
-        let client = Client::with_config(config).with_http_client(http.clone());
+        let client = Client::with_config(config)
+            .with_http_client(http.clone())
+            .with_backoff(retry_backoff());
 
         Self {
             client,
@@ -51,9 +86,17 @@ impl AiClient {
             temperature,
             configured: !api_key.is_empty(),
             provider: "gemini",
-            gemini_api_key: Some(api_key.to_string()),
-            gemini_model: Some(model.to_string()),
+            gemini_key_header: HeaderValue::from_str(api_key).ok().map(|mut value| {
+                value.set_sensitive(true);
+                value
+            }),
+            transcribe_url: Some(format!(
+                "https://generativelanguage.googleapis.com/v1beta/models/{model}:generateContent"
+            )),
+            api_base,
             raw_http: http,
+            transcriptions: Some(Arc::new(TtlCache::new(TRANSCRIPTION_CACHE_TTL, 256))),
+            completion_permits: Arc::new(Semaphore::new(MAX_CONCURRENT_COMPLETIONS)),
         }
     }
 
@@ -65,19 +108,22 @@ impl AiClient {
         temperature: f32,
         _timeout: u64,
     ) -> Self {
+        let api_base = "https://openrouter.ai/api/v1";
         let config = OpenAIConfig::new()
             .with_api_key(api_key)
-            .with_api_base("https://openrouter.ai/api/v1");
+            .with_api_base(api_base);
 
         let mut headers = reqwest::header::HeaderMap::new();
         headers.insert("HTTP-Referer", "https://yral.com".parse().unwrap());
         headers.insert("X-Title", "Yral AI Chat".parse().unwrap());
-        let custom_http = reqwest::ClientBuilder::new()
+        let custom_http = crate::services::http::client_builder()
             .default_headers(headers)
             .build()
-            .unwrap_or(http.clone());
+            .unwrap_or(http);
 
-        let client = Client::with_config(config).with_http_client(custom_http);
+        let client = Client::with_config(config)
+            .with_http_client(custom_http.clone())
+            .with_backoff(retry_backoff());
 
         Self {
             client,
@@ -86,9 +132,12 @@ impl AiClient {
             temperature,
             configured: !api_key.is_empty(),
             provider: "openrouter",
-            gemini_api_key: None,
-            gemini_model: None,
-            raw_http: http,
+            gemini_key_header: None,
+            transcribe_url: None,
+            api_base,
+            raw_http: custom_http,
+            transcriptions: None,
+            completion_permits: Arc::new(Semaphore::new(MAX_CONCURRENT_COMPLETIONS)),
         }
     }
 
@@ -96,14 +145,56 @@ impl AiClient {
         self.configured
     }
 
+    /// Open a pooled connection to the provider in the background so the
+    /// first chat turn after startup does not pay the TCP/TLS handshake.
+    pub fn spawn_warmup(&self) {
+        if !self.configured {
+            return;
+        }
+        let http = self.raw_http.clone();
+        let url = self.api_base;
+        let provider = self.provider;
+        tokio::spawn(async move {
+            match http.head(url).timeout(Duration::from_secs(5)).send().await {
+                Ok(_) => tracing::debug!(provider, "AI provider connection warmed up"),
+                Err(e) => tracing::warn!(provider, error = %e, "AI provider warmup failed"),
+            }
+        });
+    }
+
     pub async fn generate_response(
         &self,
         user_message: &str,
         system_instructions: &str,
-        conversation_history: &[Message],
+        conversation_history: Vec<Message>,
         media_urls: Option<&[String]>,
     ) -> Result<(String, i32), AppError> {
-        let mut messages: Vec<ChatCompletionRequestMessage> = Vec::new();
+        // Drop the oldest history turns while the estimated history size is
+        // over budget, so long or image-heavy chats do not bloat every request
+        let mut history_tokens: usize =
+            conversation_history.iter().map(estimate_message_tokens).sum();
+        let history_tokens_before = history_tokens;
+        let skip = conversation_history
+            .iter()
+            .take_while(|msg| {
+                if history_tokens <= HISTORY_TOKEN_BUDGET {
+                    return false;
+                }
+                history_tokens -= estimate_message_tokens(msg);
+                true
+            })
+            .count();
+        if skip > 0 {
+            tracing::debug!(
+                dropped = skip,
+                tokens_before = history_tokens_before,
+                tokens_after = history_tokens,
+                "Trimmed conversation history to token budget"
+            );
+        }
+
+        let mut messages: Vec<ChatCompletionRequestMessage> =
+            Vec::with_capacity(conversation_history.len() - skip + 2);
 
         // System message
         messages.push(ChatCompletionRequestMessage::System(
@@ -113,12 +204,12 @@ impl AiClient {
             },
         ));
 
-        // Conversation history
-        for msg in conversation_history {
+        // Conversation history (moved into the request, no per-message copies)
+        for msg in conversation_history.into_iter().skip(skip) {
             match msg.role {
                 MessageRole::User => {
                     let content =
-                        build_user_content(msg.content.as_deref().unwrap_or(""), &msg.media_urls);
+                        build_user_content(msg.content.unwrap_or_default(), msg.media_urls);
                     messages.push(ChatCompletionRequestMessage::User(
                         ChatCompletionRequestUserMessage {
                             content,
@@ -129,7 +220,7 @@ impl AiClient {
                 MessageRole::Assistant => {
                     messages.push(ChatCompletionRequestMessage::Assistant(
                         ChatCompletionRequestAssistantMessage {
-                            content: msg.content.clone().map(Into::into),
+                            content: msg.content.map(Into::into),
                             name: None,
                             ..Default::default()
                         },
@@ -139,7 +230,10 @@ impl AiClient {
         }
 
         // Current user message
-        let current_content = build_user_content(user_message, media_urls.unwrap_or(&[]));
+        let current_content = build_user_content(
+            user_message.to_string(),
+            media_urls.map(<[String]>::to_vec).unwrap_or_default(),
+        );
         messages.push(ChatCompletionRequestMessage::User(
             ChatCompletionRequestUserMessage {
                 content: current_content,
@@ -147,14 +241,39 @@ impl AiClient {
             },
         ));
 
+        let (text, total_tokens) = self
+            .chat_completion(messages, self.temperature, self.max_tokens)
+            .await?;
+
+        let token_count = total_tokens
+            .map(|t| t as i32)
+            .unwrap_or_else(|| estimate_tokens(&text));
+
+        Ok((text, token_count))
+    }
+
+    /// Send a chat completion request and return the first choice's text
+    /// along with the provider-reported total token count, if any.
+    async fn chat_completion(
+        &self,
+        messages: Vec<ChatCompletionRequestMessage>,
+        temperature: f32,
+        max_tokens: u32,
+    ) -> Result<(String, Option<u32>), AppError> {
         let request = CreateChatCompletionRequestArgs::default()
             .model(&self.model)
             .messages(messages)
-            .temperature(self.temperature)
-            .max_tokens(self.max_tokens)
+            .temperature(temperature)
+            .max_tokens(max_tokens)
             .build()
             .map_err(|e| AppError::service_unavailable(format!("Failed to build request: {e}")))?;
 
+        let _permit = self
+            .completion_permits
+            .acquire()
+            .await
+            .map_err(|_| AppError::service_unavailable("AI client is shut down"))?;
+
         let parent = sentry::configure_scope(|s| s.get_span());
         let sentry_span = parent
             .as_ref()
@@ -172,32 +291,74 @@ impl AiClient {
         }
         let response = response?;
 
+        let total_tokens = response.usage.as_ref().map(|u| u.total_tokens);
+        // Providers cache the stable prefix (system prompt first, then
+        // history) implicitly; record how much of each prompt was served from it
+        if let Some(usage) = &response.usage {
+            let cached_tokens = usage
+                .prompt_tokens_details
+                .as_ref()
+                .and_then(|d| d.cached_tokens)
+                .unwrap_or(0);
+            tracing::debug!(
+                provider = self.provider,
+                prompt_tokens = usage.prompt_tokens,
+                cached_tokens,
+                "AI prompt cache usage"
+            );
+        }
         let choice = response
             .choices
-            .first()
+            .into_iter()
+            .next()
             .ok_or_else(|| AppError::service_unavailable("Empty response from AI"))?;
 
-        let text = choice.message.content.clone().unwrap_or_default();
-
-        let token_count = response
-            .usage
-            .map(|u| u.total_tokens as i32)
-            .unwrap_or_else(|| estimate_tokens(&text));
-
-        Ok((text, token_count))
+        Ok((choice.message.content.unwrap_or_default(), total_tokens))
     }
 
     /// Transcribe audio using Gemini's native API (not OpenAI-compatible).
     /// Only works on AiClient instances created with `AiClient::gemini()`.
-    pub async fn transcribe_audio(&self, audio_url: &str) -> Result<String, AppError> {
+    ///
+    /// When `object_key` is given (our own storage key, stable across
+    /// re-signing), results are cached under it so a retried send of the same
+    /// audio does not re-download and re-transcribe it. External URLs are
+    /// never cached.
+    ///
+    /// Clips larger than `max_bytes` are rejected before transcription.
+    pub async fn transcribe_audio(
+        &self,
+        object_key: Option<&str>,
+        audio_url: &str,
+        max_bytes: u64,
+    ) -> Result<String, AppError> {
+        let (Some(key), Some(cache)) = (object_key, &self.transcriptions) else {
+            return self.fetch_transcription(audio_url, max_bytes).await;
+        };
+        if let Some(text) = cache.get(key) {
+            return Ok(text);
+        }
+
+        let text = self.fetch_transcription(audio_url, max_bytes).await?;
+        cache.insert(key.to_string(), text.clone());
+        Ok(text)
+    }
+
+    async fn fetch_transcription(
+        &self,
+        audio_url: &str,
+        max_bytes: u64,
+    ) -> Result<String, AppError> {
         let api_key = self
-            .gemini_api_key
+            .gemini_key_header
+            .as_ref()
+            .ok_or_else(|| AppError::service_unavailable("Transcription requires Gemini client"))?;
+        let url = self
+            .transcribe_url
             .as_deref()
             .ok_or_else(|| AppError::service_unavailable("Transcription requires Gemini client"))?;
-        let model = self.gemini_model.as_deref().unwrap_or("gemini-2.5-flash");
 
         // Download audio
-        let resp = self
+        let mut resp = self
             .raw_http
             .get(audio_url)
             .timeout(std::time::Duration::from_secs(15))
@@ -212,34 +373,62 @@ impl AiClient {
             .unwrap_or("audio/mpeg")
             .to_string();
 
-        let bytes = resp
-            .bytes()
-            .await
-            .map_err(|e| AppError::service_unavailable(format!("Failed to read audio: {e}")))?;
-
-        let b64 = base64::engine::general_purpose::STANDARD.encode(&bytes);
-
-        // Call native Gemini API for transcription
-        let request_body = serde_json::json!({
-            "contents": [{
-                "parts": [
-                    {"text": "Please transcribe this audio file accurately. Only return the transcription text without any additional commentary."},
-                    {"inlineData": {"mimeType": content_type, "data": b64}}
-                ]
-            }],
-            "generationConfig": {"temperature": 0.1, "maxOutputTokens": 4096}
-        });
+        // The URL comes from the client, so its reported length is only a hint
+        let declared = resp.content_length().unwrap_or(0);
+        if declared > max_bytes {
+            return Err(AppError::bad_request(format!(
+                "Audio too large. Max: {}MB",
+                max_bytes / (1024 * 1024)
+            )));
+        }
 
-        let url = format!(
-            "https://generativelanguage.googleapis.com/v1beta/models/{model}:generateContent"
+        // Base64-encode chunks as they arrive so the raw clip is never held
+        // in memory alongside its encoded copy
+        let mut encoder = EncoderStringWriter::from_consumer(
+            String::with_capacity((declared as usize).div_ceil(3) * 4),
+            &base64::engine::general_purpose::STANDARD,
         );
+        let mut received: u64 = 0;
+        while let Some(chunk) = resp
+            .chunk()
+            .await
+            .map_err(|e| AppError::service_unavailable(format!("Failed to read audio: {e}")))?
+        {
+            received += chunk.len() as u64;
+            if received > max_bytes {
+                return Err(AppError::bad_request(format!(
+                    "Audio too large. Max: {}MB",
+                    max_bytes / (1024 * 1024)
+                )));
+            }
+            encoder
+                .write_all(&chunk)
+                .map_err(|e| AppError::service_unavailable(format!("Failed to encode audio: {e}")))?;
+        }
+        let b64 = encoder.into_inner();
+
+        // JSON encoding of a large clip is CPU-bound; keep it off the async
+        // workers unless the clip is small.
+        let request_body = if b64.len() > INLINE_ENCODE_LIMIT {
+            tokio::task::spawn_blocking(move || build_transcription_body(b64, &content_type))
+                .await
+                .map_err(|e| {
+                    AppError::service_unavailable(format!("Transcription encode task failed: {e}"))
+                })?
+        } else {
+            build_transcription_body(b64, &content_type)
+        }
+        .map_err(|e| {
+            AppError::service_unavailable(format!("Failed to build transcription request: {e}"))
+        })?;
 
         let response = self
             .raw_http
-            .post(&url)
-            .header("x-goog-api-key", api_key)
+            .post(url)
+            .header("x-goog-api-key", api_key.clone())
+            .header(reqwest::header::CONTENT_TYPE, "application/json")
             .timeout(std::time::Duration::from_secs(60))
-            .json(&request_body)
+            .body(request_body)
             .send()
             .await
             .map_err(|e| {
@@ -305,60 +494,47 @@ If information updates an existing memory, use the new value.
 Format: {{"key1": "value1", "key2": "value2"}}"#
         );
 
-        let request = CreateChatCompletionRequestArgs::default()
-            .model(&self.model)
-            .messages(vec![ChatCompletionRequestMessage::User(
-                ChatCompletionRequestUserMessage {
-                    content: ChatCompletionRequestUserMessageContent::Text(prompt),
-                    name: None,
-                },
-            )])
-            .temperature(0.1f32)
-            .max_tokens(1024u32)
-            .build()
-            .map_err(|e| AppError::service_unavailable(format!("Failed to build request: {e}")))?;
+        let messages = vec![ChatCompletionRequestMessage::User(
+            ChatCompletionRequestUserMessage {
+                content: ChatCompletionRequestUserMessageContent::Text(prompt),
+                name: None,
+            },
+        )];
 
-        let response = match self.client.chat().create(request).await {
-            Ok(r) => r,
+        let text = match self.chat_completion(messages, 0.1, 1024).await {
+            Ok((text, _)) => text,
             Err(e) => {
                 tracing::error!(error = %e, "Memory extraction API error");
                 return Ok(existing_memories.clone());
             }
         };
 
-        let text = response
-            .choices
-            .first()
-            .and_then(|c| c.message.content.clone())
-            .unwrap_or_default();
-
         parse_memory_json(&text, existing_memories)
     }
 }
 
 fn build_user_content(
-    text: &str,
-    media_urls: &[String],
+    text: String,
+    media_urls: Vec<String>,
 ) -> ChatCompletionRequestUserMessageContent {
     if media_urls.is_empty() {
-        return ChatCompletionRequestUserMessageContent::Text(text.to_string());
+        return ChatCompletionRequestUserMessageContent::Text(text);
     }
 
-    let mut parts: Vec<ChatCompletionRequestUserMessageContentPart> = Vec::new();
+    let mut parts: Vec<ChatCompletionRequestUserMessageContentPart> =
+        Vec::with_capacity(media_urls.len().min(5) + 1);
 
     if !text.is_empty() {
         parts.push(ChatCompletionRequestUserMessageContentPart::Text(
-            ChatCompletionRequestMessageContentPartText {
-                text: text.to_string(),
-            },
+            ChatCompletionRequestMessageContentPartText { text },
         ));
     }
 
-    for url in media_urls.iter().take(5) {
+    for url in media_urls.into_iter().take(5) {
         parts.push(ChatCompletionRequestUserMessageContentPart::ImageUrl(
             ChatCompletionRequestMessageContentPartImage {
                 image_url: ImageUrl {
-                    url: url.clone(),
+                    url,
                     detail: None,
                 },
             },
@@ -372,15 +548,8 @@ fn parse_memory_json(
     text: &str,
     existing: &HashMap<String, String>,
 ) -> Result<HashMap<String, String>, AppError> {
-    let start = text.find('{');
-    let end = text.rfind('}');
-
-    let json_str = match (start, end) {
-        (Some(s), Some(e)) if s < e => &text[s..=e],
-        _ => return Ok(existing.clone()),
-    };
-
-    let new_memories: HashMap<String, String> = serde_json::from_str(json_str).unwrap_or_default();
+    let new_memories: HashMap<String, String> =
+        parse_json_from_response(text).unwrap_or_default();
 
     if new_memories.is_empty() {
         return Ok(existing.clone());
@@ -391,11 +560,119 @@ fn parse_memory_json(
     Ok(merged)
 }
 
+/// Parse a JSON object out of a model response. Only the first `{` is tried
+/// (the first one after an opening code fence, if there is one), and
+/// whatever follows the complete value is ignored. If that value is
+/// truncated, malformed or not a `T`, the result is `None`; later braces,
+/// including nested objects, are never tried in its place.
+pub(crate) fn parse_json_from_response<T: serde::de::DeserializeOwned>(text: &str) -> Option<T> {
+    let body = match text.find("```") {
+        Some(fence) => &text[fence + 3..],
+        None => text,
+    };
+    let start = body.find('{')?;
+    serde_json::Deserializer::from_str(&body[start..])
+        .into_iter::<T>()
+        .next()?
+        .ok()
+}
+
+/// Rough bytes-per-token ratio used when the provider does not report usage.
+const BYTES_PER_TOKEN: usize = 4;
+
 fn estimate_tokens(text: &str) -> i32 {
-    (text.len() as f64 / 4.0).ceil() as i32
+    text.len().div_ceil(BYTES_PER_TOKEN) as i32
+}
+
+/// Estimated history size allowed into a chat request.
+const HISTORY_TOKEN_BUDGET: usize = 8_000;
+/// Flat per-image cost used for budgeting (Gemini bills 258 tokens/image).
+const IMAGE_TOKEN_ESTIMATE: usize = 258;
+
+fn estimate_message_tokens(msg: &Message) -> usize {
+    let text = msg.content.as_deref().map_or(0, str::len).div_ceil(BYTES_PER_TOKEN);
+    text + msg.media_urls.len() * IMAGE_TOKEN_ESTIMATE
+}
+
+/// Encoded audio larger than this is serialized on the blocking pool.
+const INLINE_ENCODE_LIMIT: usize = 256 * 1024;
+
+/// Build the transcription request body. The base64 copy is freed before
+/// returning, leaving only the JSON body alive for upload.
+fn build_transcription_body(b64: String, content_type: &str) -> Result<Vec<u8>, serde_json::Error> {
+    // Size the body up front (base64 needs no JSON escaping) so the
+    // multi-MB payload is written into one allocation instead of regrowing
+    let mut body = Vec::with_capacity(b64.len() + TRANSCRIPTION_PROMPT.len() + 256);
+
+    // Call native Gemini API for transcription
+    serde_json::to_writer(
+        &mut body,
+        &GeminiNativeRequest {
+            contents: [GeminiRequestContent {
+                parts: [
+                    GeminiRequestPart::Text {
+                        text: TRANSCRIPTION_PROMPT,
+                    },
+                    GeminiRequestPart::InlineData {
+                        inline_data: GeminiInlineData {
+                            mime_type: content_type,
+                            data: &b64,
+                        },
+                    },
+                ],
+            }],
+            generation_config: GeminiGenerationConfig {
+                temperature: 0.1,
+                max_output_tokens: 4096,
+            },
+        },
+    )?;
+    Ok(body)
+}
+
+// Minimal types for Gemini native API (transcription only).
+// Request types borrow the base64 payload so it is serialized straight from
+// the encoded buffer instead of being copied into a serde_json::Value first.
+const TRANSCRIPTION_PROMPT: &str = "Please transcribe this audio file accurately. Only return the transcription text without any additional commentary.";
+
+#[derive(Serialize)]
+#[serde(rename_all = "camelCase")]
+struct GeminiNativeRequest<'a> {
+    contents: [GeminiRequestContent<'a>; 1],
+    generation_config: GeminiGenerationConfig,
+}
+
+#[derive(Serialize)]
+struct GeminiRequestContent<'a> {
+    parts: [GeminiRequestPart<'a>; 2],
+}
+
+#[derive(Serialize)]
+#[serde(untagged)]
+enum GeminiRequestPart<'a> {
+    Text {
+        text: &'a str,
+    },
+    InlineData {
+        #[serde(rename = "inlineData")]
+        inline_data: GeminiInlineData<'a>,
+    },
+}
+
+#[derive(Serialize)]
+#[serde(rename_all = "camelCase")]
+struct GeminiInlineData<'a> {
+    mime_type: &'a str,
+    data: &'a str,
+}
+
+#[derive(Serialize)]
+#[serde(rename_all = "camelCase")]
+struct GeminiGenerationConfig {
+    temperature: f32,
+    max_output_tokens: u32,
 }
 
-// Minimal types for Gemini native API (transcription only)
 #[derive(Deserialize)]
 struct GeminiNativeResponse {
     candidates: Option<Vec<GeminiCandidate>>,
@@ -415,3 +692,53 @@ struct GeminiContent {
 struct GeminiPart {
     text: Option<String>,
 }
+
+#[cfg(test)]
+mod tests {
+    use super::*;
+
+    #[derive(Debug, Default, Deserialize, PartialEq)]
+    struct Partial {
+        b: Option<i64>,
+    }
+
+    #[test]
+    fn parses_bare_json() {
+        let parsed: HashMap<String, String> = parse_json_from_response(r#" {"a": "1"} "#).unwrap();
+        assert_eq!(parsed["a"], "1");
+    }
+
+    #[test]
+    fn parses_prose_wrapped_json() {
+        let text = r#"Sure! Here it is: {"a": "1"} Let me know if you need more."#;
+        let parsed: HashMap<String, String> = parse_json_from_response(text).unwrap();
+        assert_eq!(parsed["a"], "1");
+    }
+
+    #[test]
+    fn parses_fenced_json_after_prose_braces() {
+        let text = "Use {name} as a placeholder:\n```json\n{\"a\": \"1\"}\n```\nDone.";
+        let parsed: HashMap<String, String> = parse_json_from_response(text).unwrap();
+        assert_eq!(parsed["a"], "1");
+    }
+
+    #[test]
+    fn truncated_json_does_not_fall_back_to_inner_object() {
+        let text = r#"{"a": {"b": 1}, "c": "#;
+        assert_eq!(parse_json_from_response::<Partial>(text), None);
+    }
+
+    #[test]
+    fn mismatched_outer_object_does_not_fall_back_to_inner_object() {
+        let text = r#"{"outer": {"a": "1"}}"#;
+        assert_eq!(
+            parse_json_from_response::<HashMap<String, String>>(text),
+            None
+        );
+    }
+
+    #[test]
+    fn text_without_json_is_none() {
+        assert_eq!(parse_json_from_response::<Partial>("no json here"), None);
+    }
+}
@@ -0,0 +1,266 @@
+use std::borrow::Borrow;
+use std::future::Future;
+use std::hash::Hash;
+use std::sync::Arc;
+use std::sync::atomic::{AtomicU64, Ordering};
+use std::time::{Duration, Instant};
+
+use dashmap::DashMap;
+use tokio::sync::Mutex;
+
+/// Small in-process cache with a fixed time-to-live per entry and a soft
+/// capacity bound. Values are cloned out on read, so store cheap-to-clone
+/// data (short strings, `Arc`s).
+pub struct TtlCache<K, V> {
+    entries: DashMap<K, (Instant, V)>,
+    // Per-key fill locks so concurrent misses for one key load it only once
+    inflight: DashMap<K, Arc<Mutex<()>>>,
+    // Bumped by `invalidate`; a fill that started before a bump discards its
+    // result instead of caching data the invalidating write made stale
+    generation: AtomicU64,
+    ttl: Duration,
+    capacity: usize,
+}
+
+impl<K, V> TtlCache<K, V>
+where
+    K: Eq + Hash,
+    V: Clone,
+{
+    pub fn new(ttl: Duration, capacity: usize) -> Self {
+        Self {
+            entries: DashMap::new(),
+            inflight: DashMap::new(),
+            generation: AtomicU64::new(0),
+            ttl,
+            capacity,
+        }
+    }
+
+    /// Return a live entry, dropping it if it has expired.
+    pub fn get<Q>(&self, key: &Q) -> Option<V>
+    where
+        K: Borrow<Q>,
+        Q: Hash + Eq + ?Sized,
+    {
+        let entry = self.entries.get(key)?;
+        if entry.0.elapsed() < self.ttl {
+            return Some(entry.1.clone());
+        }
+        drop(entry);
+        self.entries.remove(key);
+        None
+    }
+
+    pub fn insert(&self, key: K, value: V) {
+        if self.entries.len() >= self.capacity {
+            self.evict();
+        }
+        self.entries.insert(key, (Instant::now(), value));
+    }
+
+    /// Return the cached value, or load it with `fetch` and cache a found
+    /// value. Concurrent callers missing on the same key wait for the first
+    /// load instead of each hitting the origin (single-flight).
+    pub async fn get_or_try_insert_with<Q, F, Fut, E>(
+        &self,
+        key: &Q,
+        fetch: F,
+    ) -> Result<Option<V>, E>
+    where
+        K: Borrow<Q>,
+        Q: Hash + Eq + ToOwned<Owned = K> + ?Sized,
+        F: FnOnce() -> Fut,
+        Fut: Future<Output = Result<Option<V>, E>>,
+    {
+        if let Some(value) = self.get(key) {
+            return Ok(Some(value));
+        }
+
+        let lock = self.inflight.entry(key.to_owned()).or_default().clone();
+        // Declared before the lock guard so it runs after the guard is
+        // released, including when this future is dropped mid-fill
+        let _cleanup = InflightCleanup {
+            inflight: &self.inflight,
+            key,
+        };
+        let _guard = lock.lock().await;
+
+        // Another caller may have filled the entry while we waited
+        if let Some(value) = self.get(key) {
+            return Ok(Some(value));
+        }
+
+        let generation = self.generation.load(Ordering::SeqCst);
+        let result = fetch().await;
+        if let Ok(Some(value)) = &result {
+            self.insert(key.to_owned(), value.clone());
+            // A write was invalidated while fetching, so the loaded value may
+            // predate it. Checking after the insert also covers an
+            // invalidation that ran just before it.
+            if self.generation.load(Ordering::SeqCst) != generation {
+                self.entries.remove(key);
+            }
+        }
+        result
+    }
+
+    pub fn invalidate<Q>(&self, key: &Q)
+    where
+        K: Borrow<Q>,
+        Q: Hash + Eq + ?Sized,
+    {
+        self.generation.fetch_add(1, Ordering::SeqCst);
+        self.entries.remove(key);
+    }
+
+    /// Drop expired entries; if the cache is still full, clear it so memory
+    /// stays bounded (entries are cheap to recompute).
+    fn evict(&self) {
+        let ttl = self.ttl;
+        self.entries.retain(|_, (at, _)| at.elapsed() < ttl);
+        if self.entries.len() >= self.capacity {
+            self.entries.clear();
+        }
+    }
+}
+
+/// Removes a key's fill lock once no other caller holds it.
+struct InflightCleanup<'a, K, Q: ?Sized>
+where
+    K: Eq + Hash + Borrow<Q>,
+    Q: Hash + Eq,
+{
+    inflight: &'a DashMap<K, Arc<Mutex<()>>>,
+    key: &'a Q,
+}
+
+impl<K, Q: ?Sized> Drop for InflightCleanup<'_, K, Q>
+where
+    K: Eq + Hash + Borrow<Q>,
+    Q: Hash + Eq,
+{
+    fn drop(&mut self) {
+        // The map and the dropping caller's clone account for two references
+        self.inflight
+            .remove_if(self.key, |_, lock| Arc::strong_count(lock) <= 2);
+    }
+}
+
+#[cfg(test)]
+mod tests {
+    use std::sync::atomic::AtomicUsize;
+
+    use tokio::sync::oneshot;
+
+    use super::*;
+
+    fn cache(ttl: Duration) -> Arc<TtlCache<String, u32>> {
+        Arc::new(TtlCache::new(ttl, 16))
+    }
+
+    #[tokio::test]
+    async fn concurrent_misses_run_one_load() {
+        let cache = cache(Duration::from_secs(60));
+        let calls = Arc::new(AtomicUsize::new(0));
+
+        let tasks: Vec<_> = (0..16)
+            .map(|_| {
+                let cache = cache.clone();
+                let calls = calls.clone();
+                tokio::spawn(async move {
+                    cache
+                        .get_or_try_insert_with("k", move || async move {
+                            calls.fetch_add(1, Ordering::SeqCst);
+                            tokio::time::sleep(Duration::from_millis(20)).await;
+                            Ok::<_, ()>(Some(7))
+                        })
+                        .await
+                })
+            })
+            .collect();
+        for task in tasks {
+            assert_eq!(task.await.unwrap(), Ok(Some(7)));
+        }
+
+        assert_eq!(calls.load(Ordering::SeqCst), 1);
+        assert_eq!(cache.get("k"), Some(7));
+        assert!(cache.inflight.is_empty());
+    }
+
+    #[tokio::test]
+    async fn invalidate_during_load_discards_stale_value() {
+        let cache = cache(Duration::from_secs(60));
+        let (started_tx, started_rx) = oneshot::channel();
+        let (release_tx, release_rx) = oneshot::channel::<()>();
+
+        let fill = tokio::spawn({
+            let cache = cache.clone();
+            async move {
+                cache
+                    .get_or_try_insert_with("k", move || async move {
+                        started_tx.send(()).unwrap();
+                        release_rx.await.unwrap();
+                        Ok::<_, ()>(Some(1))
+                    })
+                    .await
+            }
+        });
+
+        started_rx.await.unwrap();
+        cache.invalidate("k");
+        release_tx.send(()).unwrap();
+
+        // The caller still gets what it loaded, but it is not cached
+        assert_eq!(fill.await.unwrap(), Ok(Some(1)));
+        assert_eq!(cache.get("k"), None);
+    }
+
+    #[test]
+    fn entries_expire_after_ttl() {
+        let cache = cache(Duration::from_millis(20));
+        cache.insert("k".to_string(), 1);
+        assert_eq!(cache.get("k"), Some(1));
+
+        std::thread::sleep(Duration::from_millis(40));
+        assert_eq!(cache.get("k"), None);
+        assert!(cache.entries.is_empty());
+    }
+
+    #[test]
+    fn full_cache_is_cleared_on_insert() {
+        let cache = TtlCache::new(Duration::from_secs(60), 2);
+        cache.insert(1, "a");
+        cache.insert(2, "b");
+        cache.insert(3, "c");
+        assert_eq!(cache.get(&1), None);
+        assert_eq!(cache.get(&3), Some("c"));
+    }
+
+    #[tokio::test]
+    async fn failed_load_removes_fill_lock_and_caches_nothing() {
+        let cache = cache(Duration::from_secs(60));
+        let result = cache
+            .get_or_try_insert_with("k", || async { Err::<Option<u32>, _>("db down") })
+            .await;
+
+        assert_eq!(result, Err("db down"));
+        assert_eq!(cache.get("k"), None);
+        assert!(cache.inflight.is_empty());
+    }
+
+    #[tokio::test]
+    async fn cancelled_load_removes_fill_lock() {
+        let cache = cache(Duration::from_secs(60));
+        let pending = cache.get_or_try_insert_with("k", || async {
+            std::future::pending::<Result<Option<u32>, ()>>().await
+        });
+        assert!(
+            tokio::time::timeout(Duration::from_millis(10), pending)
+                .await
+                .is_err()
+        );
+
+        assert!(cache.inflight.is_empty());
+    }
+}
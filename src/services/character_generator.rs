@@ -1,8 +1,11 @@
+use std::sync::LazyLock;
+
+use regex::Regex;
 use serde::Deserialize;
 
 use crate::error::AppError;
 use crate::models::responses::GeneratedMetadataResponse;
-use crate::services::ai::AiClient;
+use crate::services::ai::{AiClient, parse_json_from_response};
 use crate::services::replicate::ReplicateClient;
 
 const GENERATE_PROMPT: &str = r#"You are an expert AI Character Architect. Transform the user's concept into high-fidelity System Instructions.
@@ -138,9 +141,15 @@ const SAFETY_REFUSALS: &[&str] = &[
     "harmful",
 ];
 
+/// All refusal phrases as one case-insensitive alternation, so a response is
+/// scanned once without lowercasing a copy of it.
+static SAFETY_REFUSAL_REGEX: LazyLock<Regex> = LazyLock::new(|| {
+    let alternation: Vec<String> = SAFETY_REFUSALS.iter().map(|r| regex::escape(r)).collect();
+    Regex::new(&format!("(?i){}", alternation.join("|"))).unwrap()
+});
+
 fn contains_safety_refusal(text: &str) -> bool {
-    let lower = text.to_lowercase();
-    SAFETY_REFUSALS.iter().any(|r| lower.contains(r))
+    SAFETY_REFUSAL_REGEX.is_match(text)
 }
 
 fn invalid_metadata(reason: &str) -> GeneratedMetadataResponse {
@@ -186,7 +195,7 @@ impl CharacterGeneratorService {
         prompt: &str,
     ) -> Result<String, AppError> {
         let (text, _) = gemini
-            .generate_response(prompt, GENERATE_PROMPT, &[], None)
+            .generate_response(prompt, GENERATE_PROMPT, Vec::new(), None)
             .await?;
         Ok(text)
     }
@@ -201,7 +210,7 @@ impl CharacterGeneratorService {
         }
 
         let (text, _) = gemini
-            .generate_response(system_instructions, VALIDATE_PROMPT, &[], None)
+            .generate_response(system_instructions, VALIDATE_PROMPT, Vec::new(), None)
             .await?;
 
         if contains_safety_refusal(&text) {
@@ -273,7 +282,7 @@ impl CharacterGeneratorService {
             .generate_response(
                 &prompt,
                 "You are a helpful assistant that returns valid JSON.",
-                &[],
+                Vec::new(),
                 None,
             )
             .await?;
@@ -301,7 +310,7 @@ impl CharacterGeneratorService {
             .replace("{system_instructions}", system_instructions);
 
         let (text, _) = gemini
-            .generate_response(&prompt, "You are a helpful assistant.", &[], None)
+            .generate_response(&prompt, "You are a helpful assistant.", Vec::new(), None)
             .await?;
 
         Ok(text.trim().to_string())
@@ -333,7 +342,7 @@ impl CharacterGeneratorService {
             .generate_response(
                 &prompt,
                 "You are a helpful assistant.",
-                &[],
+                Vec::new(),
                 if media_urls.is_empty() {
                     None
                 } else {
@@ -369,7 +378,7 @@ impl CharacterGeneratorService {
             .generate_response(
                 &prompt,
                 "You are a helpful assistant.",
-                &[],
+                Vec::new(),
                 if media_urls.is_empty() {
                     None
                 } else {
@@ -381,12 +390,3 @@ impl CharacterGeneratorService {
         Ok(text.trim().to_string())
     }
 }
-
-fn parse_json_from_response<T: serde::de::DeserializeOwned>(text: &str) -> Option<T> {
-    let start = text.find('{')?;
-    let end = text.rfind('}')?;
-    if start >= end {
-        return None;
-    }
-    serde_json::from_str(&text[start..=end]).ok()
-}
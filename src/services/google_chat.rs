@@ -1,3 +1,12 @@
+use serde::Serialize;
+
+/// Google Chat webhook body. Borrows the text so nothing is copied into an
+/// intermediate JSON value before serialization.
+#[derive(Serialize)]
+struct WebhookMessage<'a> {
+    text: &'a str,
+}
+
 /// Google Chat webhook notification service.
 #[derive(Clone)]
 pub struct GoogleChatService {
@@ -15,12 +24,10 @@ impl GoogleChatService {
             return;
         };
 
-        let payload = serde_json::json!({ "text": text });
-
         match self
             .http
             .post(url)
-            .json(&payload)
+            .json(&WebhookMessage { text })
             .timeout(std::time::Duration::from_secs(10))
             .send()
             .await
@@ -35,31 +42,38 @@ impl GoogleChatService {
         }
     }
 
-    pub async fn notify_influencer_banned(&self, influencer_id: &str, influencer_name: &str) {
-        self.send_message(&format!(
+    /// Post a message without making the caller wait on the webhook.
+    fn send_in_background(&self, text: String) {
+        if self.webhook_url.is_none() {
+            return;
+        }
+        let service = self.clone();
+        tokio::spawn(async move {
+            service.send_message(&text).await;
+        });
+    }
+
+    pub fn notify_influencer_banned(&self, influencer_id: &str, influencer_name: &str) {
+        self.send_in_background(format!(
             "🚫 AI Influencer banned\nID: {influencer_id}\nName: {influencer_name}"
-        ))
-        .await;
+        ));
     }
 
-    pub async fn notify_influencer_ban_failed(&self, influencer_id: &str, error: &str) {
-        self.send_message(&format!(
+    pub fn notify_influencer_ban_failed(&self, influencer_id: &str, error: &str) {
+        self.send_in_background(format!(
             "❌ Failed to ban AI Influencer\nID: {influencer_id}\nError: {error}"
-        ))
-        .await;
+        ));
     }
 
-    pub async fn notify_influencer_unbanned(&self, influencer_id: &str, influencer_name: &str) {
-        self.send_message(&format!(
+    pub fn notify_influencer_unbanned(&self, influencer_id: &str, influencer_name: &str) {
+        self.send_in_background(format!(
             "✅ AI Influencer unbanned\nID: {influencer_id}\nName: {influencer_name}"
-        ))
-        .await;
+        ));
     }
 
-    pub async fn notify_influencer_unban_failed(&self, influencer_id: &str, error: &str) {
-        self.send_message(&format!(
+    pub fn notify_influencer_unban_failed(&self, influencer_id: &str, error: &str) {
+        self.send_in_background(format!(
             "❌ Failed to unban AI Influencer\nID: {influencer_id}\nError: {error}"
-        ))
-        .await;
+        ));
     }
 }
@@ -0,0 +1,20 @@
+use std::time::Duration;
+
+/// Builder for outbound HTTP clients with the app-wide connection pool
+/// settings. Services that need extra default headers start from this so
+/// they keep the same keep-alive and connect behaviour as the shared client.
+/// HTTP/2 is negotiated via ALPN where the upstream supports it, so concurrent
+/// calls to the same host share one connection. Idle HTTP/2 connections are
+/// pinged so a connection silently dropped upstream is noticed before the
+/// next chat turn tries to use it.
+pub fn client_builder() -> reqwest::ClientBuilder {
+    reqwest::Client::builder()
+        .connect_timeout(Duration::from_secs(5))
+        .pool_idle_timeout(Duration::from_secs(120))
+        .tcp_keepalive(Duration::from_secs(60))
+        .pool_max_idle_per_host(50)
+        .http2_adaptive_window(true)
+        .http2_keep_alive_interval(Duration::from_secs(30))
+        .http2_keep_alive_timeout(Duration::from_secs(10))
+        .http2_keep_alive_while_idle(true)
+}
@@ -1,6 +1,8 @@
 pub mod ai;
+pub mod cache;
 pub mod character_generator;
 pub mod google_chat;
+pub mod http;
 pub mod moderation;
 pub mod notification;
 pub mod replicate;
@@ -1,3 +1,5 @@
+use std::sync::LazyLock;
+
 pub const STYLE_PROMPT: &str = "\
 IMPORTANT: Avoid apologies or self-corrections in your responses.";
 
@@ -11,15 +13,29 @@ Key Rules:
 - Maintain consistency with your persona at all times
 - Ensure all content is safe for all ages";
 
+/// The text `with_guardrails` appends, built once.
+static GUARDRAILS_SUFFIX: LazyLock<String> =
+    LazyLock::new(|| format!("\n{STYLE_PROMPT}\n{MODERATION_PROMPT}"));
+
 /// Append style + moderation prompts to system instructions.
 pub fn with_guardrails(instructions: &str) -> String {
-    format!("{instructions}\n{STYLE_PROMPT}\n{MODERATION_PROMPT}")
+    [instructions, GUARDRAILS_SUFFIX.as_str()].concat()
 }
 
 /// Strip appended guardrails from system instructions for display.
 pub fn strip_guardrails(instructions: &str) -> String {
-    instructions
-        .replace(STYLE_PROMPT, "")
+    // Fast path: guardrails added by `with_guardrails` sit at the very end,
+    // so peel them off as a suffix and skip the full-string replaces.
+    let base = instructions
+        .trim_end()
+        .strip_suffix(MODERATION_PROMPT)
+        .and_then(|rest| rest.trim_end().strip_suffix(STYLE_PROMPT))
+        .unwrap_or(instructions);
+    if !base.contains(STYLE_PROMPT) && !base.contains(MODERATION_PROMPT) {
+        return base.trim().to_string();
+    }
+
+    base.replace(STYLE_PROMPT, "")
         .replace(MODERATION_PROMPT, "")
         .trim()
         .to_string()
@@ -1,51 +1,138 @@
+use std::sync::Arc;
+
+use reqwest::header::{AUTHORIZATION, HeaderValue};
+use serde::Serialize;
+use tokio::sync::{Mutex, mpsc};
+
+/// Pending pushes beyond this are dropped rather than piling up tasks while
+/// the metadata server is slow.
+const PUSH_QUEUE_CAPACITY: usize = 10_000;
+const PUSH_WORKERS: usize = 8;
+
+struct PushJob {
+    user_id: String,
+    title: String,
+    body: String,
+    data: Option<serde_json::Value>,
+}
+
+#[derive(Serialize)]
+struct PushPayload<'a> {
+    data: PushData<'a>,
+}
+
+/// Notification data: title/body plus any caller-supplied keys, serialized
+/// straight from borrowed values instead of a cloned JSON map.
+#[derive(Serialize)]
+struct PushData<'a> {
+    title: &'a str,
+    body: &'a str,
+    #[serde(flatten)]
+    extra: Option<&'a serde_json::Map<String, serde_json::Value>>,
+}
+
 /// Push notification service via Yral Metadata Server.
+/// Shares the app-wide HTTP client, so metadata-server connections are pooled.
+/// Pushes are queued and delivered by a fixed pool of worker tasks.
 #[derive(Clone)]
 pub struct PushNotificationService {
     http: reqwest::Client,
     metadata_url: String,
-    auth_token: Option<String>,
+    auth_header: Option<HeaderValue>,
     configured: bool,
+    queue: Option<mpsc::Sender<PushJob>>,
 }
 
 impl PushNotificationService {
     pub fn new(http: reqwest::Client, metadata_url: &str, auth_token: Option<String>) -> Self {
         let configured = auth_token.as_ref().is_some_and(|t| !t.is_empty());
-        Self {
+        // Build the bearer header once rather than formatting it per notification
+        let auth_header = auth_token.and_then(|token| {
+            let mut value = HeaderValue::from_str(&format!("Bearer {token}")).ok()?;
+            value.set_sensitive(true);
+            Some(value)
+        });
+        let mut service = Self {
             http,
             metadata_url: metadata_url.to_string(),
-            auth_token,
+            auth_header,
             configured,
+            queue: None,
+        };
+        if configured {
+            let (tx, rx) = mpsc::channel(PUSH_QUEUE_CAPACITY);
+            let rx = Arc::new(Mutex::new(rx));
+            for _ in 0..PUSH_WORKERS {
+                tokio::spawn(service.clone().run_worker(rx.clone()));
+            }
+            service.queue = Some(tx);
         }
+        service
     }
 
-    pub async fn send_push_notification(
+    /// Queue a push for background delivery. Never waits: if the queue is
+    /// full the notification is dropped with a warning.
+    pub fn send_push_notification(
         &self,
-        user_id: &str,
-        title: &str,
-        body: &str,
-        data: Option<&serde_json::Value>,
-    ) -> bool {
-        if !self.configured {
-            return false;
+        user_id: String,
+        title: String,
+        body: String,
+        data: Option<serde_json::Value>,
+    ) {
+        let Some(queue) = &self.queue else {
+            return;
+        };
+        let job = PushJob {
+            user_id,
+            title,
+            body,
+            data,
+        };
+        if let Err(mpsc::error::TrySendError::Full(job)) = queue.try_send(job) {
+            tracing::warn!(user_id = %job.user_id, "Push queue full, dropping notification");
         }
+    }
 
-        let url = format!("{}/notifications/{user_id}/send", self.metadata_url);
+    async fn run_worker(self, rx: Arc<Mutex<mpsc::Receiver<PushJob>>>) {
+        loop {
+            let job = rx.lock().await.recv().await;
+            let Some(job) = job else { break };
+            self.deliver(&job).await;
+        }
+    }
 
-        let mut payload = serde_json::json!({
-            "data": {
-                "title": title,
-                "body": body,
+    /// Open a pooled connection to the metadata server in the background so
+    /// the first push after startup does not pay the TCP/TLS handshake.
+    pub fn spawn_warmup(&self) {
+        if !self.configured {
+            return;
+        }
+        let http = self.http.clone();
+        let url = self.metadata_url.clone();
+        tokio::spawn(async move {
+            match http
+                .head(&url)
+                .timeout(std::time::Duration::from_secs(5))
+                .send()
+                .await
+            {
+                Ok(_) => tracing::debug!("Metadata server connection warmed up"),
+                Err(e) => tracing::warn!(error = %e, "Metadata server warmup failed"),
             }
         });
+    }
 
-        if let Some(extra) = data
-            && let Some(obj) = extra.as_object()
-            && let Some(data_obj) = payload["data"].as_object_mut()
-        {
-            for (k, v) in obj {
-                data_obj.insert(k.clone(), v.clone());
-            }
-        }
+    async fn deliver(&self, job: &PushJob) {
+        let user_id = &job.user_id;
+        let url = format!("{}/notifications/{user_id}/send", self.metadata_url);
+
+        let payload = PushPayload {
+            data: PushData {
+                title: &job.title,
+                body: &job.body,
+                extra: job.data.as_ref().and_then(serde_json::Value::as_object),
+            },
+        };
 
         let mut req = self
             .http
@@ -53,23 +140,21 @@ impl PushNotificationService {
             .json(&payload)
             .timeout(std::time::Duration::from_secs(10));
 
-        if let Some(token) = &self.auth_token {
-            req = req.header("Authorization", format!("Bearer {token}"));
+        if let Some(auth) = &self.auth_header {
+            req = req.header(AUTHORIZATION, auth.clone());
         }
 
         match req.send().await {
-            Ok(resp) if resp.status().is_success() => true,
+            Ok(resp) if resp.status().is_success() => {}
             Ok(resp) => {
                 tracing::error!(
                     status = %resp.status(),
                     user_id = %user_id,
                     "Push notification failed"
                 );
-                false
             }
             Err(e) => {
                 tracing::error!(error = %e, user_id = %user_id, "Push notification error");
-                false
             }
         }
     }
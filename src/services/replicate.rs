@@ -1,18 +1,68 @@
+use std::sync::Arc;
+use std::time::Duration;
+
+use backoff::backoff::Backoff;
+use reqwest::StatusCode;
+use reqwest::header::{AUTHORIZATION, HeaderValue, RETRY_AFTER};
 use serde::{Deserialize, Serialize};
+use tokio::sync::Semaphore;
 
 use crate::error::AppError;
 
+/// Predictions can hold a connection for minutes ("Prefer: wait" plus
+/// polling); cap how many run at once so a burst queues instead of piling
+/// up sockets and tasks.
+const MAX_CONCURRENT_PREDICTIONS: usize = 8;
+/// Retries for a prediction create that was refused (429/503) or never sent.
+const MAX_CREATE_RETRIES: u32 = 3;
+const MAX_RETRY_DELAY: Duration = Duration::from_secs(30);
+
 #[derive(Clone)]
 pub struct ReplicateClient {
     http: reqwest::Client,
-    api_token: String,
+    auth_header: Option<HeaderValue>,
     model: String,
     configured: bool,
+    permits: Arc<Semaphore>,
 }
 
 #[derive(Serialize)]
-struct PredictionRequest {
-    input: serde_json::Value,
+struct PredictionRequest<'a> {
+    input: PredictionInput<'a>,
+}
+
+/// Flux model inputs. Serialized straight from borrowed fields; the
+/// image-to-image-only options are omitted when unset.
+#[derive(Clone, Copy, Serialize)]
+struct PredictionInput<'a> {
+    prompt: &'a str,
+    go_fast: bool,
+    megapixels: &'static str,
+    aspect_ratio: &'a str,
+    output_format: &'static str,
+    output_quality: u8,
+    #[serde(skip_serializing_if = "Option::is_none")]
+    guidance: Option<f32>,
+    #[serde(skip_serializing_if = "Option::is_none")]
+    num_inference_steps: Option<u32>,
+    #[serde(skip_serializing_if = "Option::is_none")]
+    input_image: Option<&'a str>,
+}
+
+impl<'a> PredictionInput<'a> {
+    fn new(prompt: &'a str, aspect_ratio: &'a str) -> Self {
+        Self {
+            prompt,
+            go_fast: true,
+            megapixels: "1",
+            aspect_ratio,
+            output_format: "jpg",
+            output_quality: 80,
+            guidance: None,
+            num_inference_steps: None,
+            input_image: None,
+        }
+    }
 }
 
 #[derive(Deserialize)]
@@ -33,8 +83,15 @@ impl ReplicateClient {
         Self {
             http,
             configured: !api_token.is_empty(),
-            api_token: api_token.to_string(),
+            // Build the bearer header once rather than formatting it per call
+            auth_header: HeaderValue::from_str(&format!("Bearer {api_token}"))
+                .ok()
+                .map(|mut value| {
+                    value.set_sensitive(true);
+                    value
+                }),
             model: model.to_string(),
+            permits: Arc::new(Semaphore::new(MAX_CONCURRENT_PREDICTIONS)),
         }
     }
 
@@ -42,23 +99,20 @@ impl ReplicateClient {
         self.configured
     }
 
+    fn authorized(&self, req: reqwest::RequestBuilder) -> reqwest::RequestBuilder {
+        match &self.auth_header {
+            Some(auth) => req.header(AUTHORIZATION, auth.clone()),
+            None => req,
+        }
+    }
+
     pub async fn generate_image(
         &self,
         prompt: &str,
         aspect_ratio: &str,
     ) -> Result<Option<String>, AppError> {
-        self.run_prediction(
-            &self.model,
-            serde_json::json!({
-                "prompt": prompt,
-                "go_fast": true,
-                "megapixels": "1",
-                "aspect_ratio": aspect_ratio,
-                "output_format": "jpg",
-                "output_quality": 80
-            }),
-        )
-        .await
+        self.run_prediction(&self.model, PredictionInput::new(prompt, aspect_ratio))
+            .await
     }
 
     pub async fn generate_image_via_image(
@@ -69,17 +123,12 @@ impl ReplicateClient {
     ) -> Result<Option<String>, AppError> {
         self.run_prediction(
             "black-forest-labs/flux-kontext-dev",
-            serde_json::json!({
-                "prompt": prompt,
-                "go_fast": true,
-                "guidance": 2.5,
-                "megapixels": "1",
-                "num_inference_steps": 30,
-                "aspect_ratio": aspect_ratio,
-                "output_format": "jpg",
-                "output_quality": 80,
-                "input_image": input_image
-            }),
+            PredictionInput {
+                guidance: Some(2.5),
+                num_inference_steps: Some(30),
+                input_image: Some(input_image),
+                ..PredictionInput::new(prompt, aspect_ratio)
+            },
         )
         .await
     }
@@ -87,7 +136,7 @@ impl ReplicateClient {
     async fn run_prediction(
         &self,
         model: &str,
-        input: serde_json::Value,
+        input: PredictionInput<'_>,
     ) -> Result<Option<String>, AppError> {
         if !self.configured {
             return Ok(None);
@@ -95,16 +144,61 @@ impl ReplicateClient {
 
         let url = format!("https://api.replicate.com/v1/models/{model}/predictions");
 
-        let resp = self
-            .http
-            .post(&url)
-            .header("Authorization", format!("Bearer {}", self.api_token))
-            .header("Prefer", "wait")
-            .json(&PredictionRequest { input })
-            .timeout(std::time::Duration::from_secs(120))
-            .send()
-            .await
-            .map_err(|e| AppError::service_unavailable(format!("Replicate API error: {e}")))?;
+        // Creating a prediction is not idempotent: a 500 or 502 may arrive
+        // after Replicate has already created (and billed) it. Only retry
+        // when the request never reached Replicate, or it was throttled (429)
+        // or unavailable (503) and so created nothing. Backoff waits happen
+        // without a permit so they do not hold a concurrency slot.
+        let mut backoff = create_backoff();
+        let mut retries = 0;
+        let (resp, _permit) = loop {
+            // Held until the prediction (including polling) finishes
+            let permit = self
+                .permits
+                .acquire()
+                .await
+                .map_err(|_| AppError::service_unavailable("Replicate client is shut down"))?;
+
+            let sent = self
+                .authorized(self.http.post(&url))
+                .header("Prefer", "wait")
+                .json(&PredictionRequest { input })
+                .timeout(std::time::Duration::from_secs(120))
+                .send()
+                .await;
+
+            let delay = match &sent {
+                Err(e) if e.is_connect() => backoff.next_backoff(),
+                Ok(resp)
+                    if matches!(
+                        resp.status(),
+                        StatusCode::TOO_MANY_REQUESTS | StatusCode::SERVICE_UNAVAILABLE
+                    ) =>
+                {
+                    retry_after(resp).or_else(|| backoff.next_backoff())
+                }
+                _ => None,
+            };
+            match delay {
+                Some(delay) if retries < MAX_CREATE_RETRIES => {
+                    drop(permit);
+                    retries += 1;
+                    tracing::warn!(
+                        status = ?sent.as_ref().ok().map(reqwest::Response::status),
+                        retry = retries,
+                        ?delay,
+                        "Retrying Replicate prediction"
+                    );
+                    tokio::time::sleep(delay.min(MAX_RETRY_DELAY)).await;
+                }
+                _ => {
+                    let resp = sent.map_err(|e| {
+                        AppError::service_unavailable(format!("Replicate API error: {e}"))
+                    })?;
+                    break (resp, permit);
+                }
+            }
+        };
 
         if !resp.status().is_success() {
             let status = resp.status();
@@ -128,7 +222,7 @@ impl ReplicateClient {
             return self.poll_prediction(&poll_url).await;
         }
 
-        Ok(extract_output_url(&prediction.output))
+        Ok(extract_output_url(prediction.output))
     }
 
     async fn poll_prediction(&self, url: &str) -> Result<Option<String>, AppError> {
@@ -136,9 +230,7 @@ impl ReplicateClient {
             tokio::time::sleep(std::time::Duration::from_secs(2)).await;
 
             let resp = self
-                .http
-                .get(url)
-                .header("Authorization", format!("Bearer {}", self.api_token))
+                .authorized(self.http.get(url))
                 .timeout(std::time::Duration::from_secs(10))
                 .send()
                 .await
@@ -149,7 +241,7 @@ impl ReplicateClient {
             })?;
 
             match prediction.status.as_str() {
-                "succeeded" => return Ok(extract_output_url(&prediction.output)),
+                "succeeded" => return Ok(extract_output_url(prediction.output)),
                 "failed" | "canceled" => {
                     return Err(AppError::service_unavailable("Image generation failed"));
                 }
@@ -161,12 +253,39 @@ impl ReplicateClient {
     }
 }
 
-fn extract_output_url(output: &Option<serde_json::Value>) -> Option<String> {
-    match output {
-        Some(serde_json::Value::Array(arr)) => {
-            arr.first().and_then(|v| v.as_str().map(String::from))
-        }
-        Some(serde_json::Value::String(s)) => Some(s.clone()),
+/// Jittered exponential backoff for prediction creation: 1s doubling, +/-50%.
+fn create_backoff() -> backoff::ExponentialBackoff {
+    backoff::ExponentialBackoffBuilder::new()
+        .with_initial_interval(Duration::from_secs(1))
+        .with_randomization_factor(0.5)
+        .with_multiplier(2.0)
+        .with_max_interval(MAX_RETRY_DELAY)
+        .with_max_elapsed_time(None)
+        .build()
+}
+
+/// Delay requested by a Retry-After header given in seconds.
+fn retry_after(resp: &reqwest::Response) -> Option<Duration> {
+    let secs = resp
+        .headers()
+        .get(RETRY_AFTER)?
+        .to_str()
+        .ok()?
+        .trim()
+        .parse()
+        .ok()?;
+    Some(Duration::from_secs(secs))
+}
+
+/// Take the output URL out of a prediction (a single URL or a list whose
+/// first entry is the image), moving the string rather than copying it.
+fn extract_output_url(output: Option<serde_json::Value>) -> Option<String> {
+    let first = match output? {
+        serde_json::Value::Array(arr) => arr.into_iter().next()?,
+        other => other,
+    };
+    match first {
+        serde_json::Value::String(url) => Some(url),
         _ => None,
     }
 }
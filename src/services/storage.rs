@@ -1,26 +1,48 @@
-use std::collections::HashMap;
+use std::collections::{HashMap, HashSet};
 use std::time::Duration;
 
 use aws_sdk_s3::Client;
 use aws_sdk_s3::config::{Credentials, Region};
 use aws_sdk_s3::presigning::PresigningConfig;
 use aws_sdk_s3::primitives::ByteStream;
+use futures::stream::{self, StreamExt};
 
 use crate::config::Settings;
 use crate::error::AppError;
+use crate::services::cache::TtlCache;
+
+/// Presigned URLs kept for reuse across chat turns.
+const PRESIGNED_CACHE_CAPACITY: usize = 4096;
+/// Presigning futures polled at once by `generate_presigned_urls_batch`.
+const PRESIGN_CONCURRENCY: usize = 32;
 
 pub struct StorageService {
     client: Client,
     bucket: String,
     http_client: reqwest::Client,
     public_url_base: String,
-    url_expires_seconds: u32,
+    // Built once; expiry is relative to each signing, so it can be reused
+    presigning: PresigningConfig,
+    // Handed out for at most half their lifetime, so clients always get
+    // a URL with at least half its validity left
+    presigned: TtlCache<String, String>,
     max_image_size_bytes: u64,
     max_audio_size_bytes: u64,
 }
 
 const IMAGE_EXTENSIONS: &[&str] = &[".jpg", ".jpeg", ".png", ".gif", ".webp"];
 const AUDIO_EXTENSIONS: &[&str] = &[".mp3", ".m4a", ".wav", ".ogg"];
+const MIME_TYPES: &[(&str, &str)] = &[
+    (".jpg", "image/jpeg"),
+    (".jpeg", "image/jpeg"),
+    (".png", "image/png"),
+    (".gif", "image/gif"),
+    (".webp", "image/webp"),
+    (".mp3", "audio/mpeg"),
+    (".m4a", "audio/mp4"),
+    (".wav", "audio/wav"),
+    (".ogg", "audio/ogg"),
+];
 
 impl StorageService {
     pub fn new(settings: &Settings, http_client: reqwest::Client) -> Result<Self, anyhow::Error> {
@@ -41,13 +63,24 @@ impl StorageService {
             .build();
 
         let client = Client::from_conf(config);
+        let presigning = PresigningConfig::expires_in(Duration::from_secs(
+            settings.s3_url_expires_seconds as u64,
+        ))?;
 
         Ok(Self {
             client,
             bucket: settings.aws_s3_bucket.clone(),
             http_client,
-            public_url_base: settings.s3_public_url_base.clone(),
-            url_expires_seconds: settings.s3_url_expires_seconds,
+            // Normalised once so key extraction is a single prefix strip
+            public_url_base: settings
+                .s3_public_url_base
+                .trim_end_matches('/')
+                .to_string(),
+            presigning,
+            presigned: TtlCache::new(
+                Duration::from_secs(settings.s3_url_expires_seconds as u64 / 2),
+                PRESIGNED_CACHE_CAPACITY,
+            ),
             max_image_size_bytes: settings.max_image_size_bytes(),
             max_audio_size_bytes: settings.max_audio_size_bytes(),
         })
@@ -82,20 +115,23 @@ impl StorageService {
         if key.starts_with("http://") || key.starts_with("https://") {
             return key.to_string();
         }
-
-        let expires =
-            PresigningConfig::expires_in(Duration::from_secs(self.url_expires_seconds as u64))
-                .expect("valid presigning config");
+        if let Some(url) = self.presigned.get(key) {
+            return url;
+        }
 
         match self
             .client
             .get_object()
             .bucket(&self.bucket)
             .key(key)
-            .presigned(expires)
+            .presigned(self.presigning.clone())
             .await
         {
-            Ok(presigned) => presigned.uri().to_string(),
+            Ok(presigned) => {
+                let url = presigned.uri().to_string();
+                self.presigned.insert(key.to_string(), url.clone());
+                url
+            }
             Err(e) => {
                 tracing::error!(error = %e, key = key, "Failed to generate presigned URL");
                 key.to_string()
@@ -103,30 +139,41 @@ impl StorageService {
         }
     }
 
+    /// Presign each distinct S3 key once. Empty keys and full URLs are left
+    /// out of the map; callers fall back to the original value for those.
     pub async fn generate_presigned_urls_batch(&self, keys: &[String]) -> HashMap<String, String> {
-        let mut map = HashMap::with_capacity(keys.len());
-        for key in keys {
-            let url = self.generate_presigned_url(key).await;
-            map.insert(key.clone(), url);
-        }
-        map
+        let mut seen = HashSet::with_capacity(keys.len());
+        let keys: Vec<&String> = keys
+            .iter()
+            .filter(|key| {
+                !key.is_empty()
+                    && !key.starts_with("http://")
+                    && !key.starts_with("https://")
+                    && seen.insert(key.as_str())
+            })
+            .collect();
+
+        // Bounded fan-out so a large page of keys does not sign all at once
+        let presigns = keys.iter().map(|key| self.generate_presigned_url(key));
+        let urls: Vec<String> = stream::iter(presigns)
+            .buffered(PRESIGN_CONCURRENCY)
+            .collect()
+            .await;
+        keys.into_iter().cloned().zip(urls).collect()
     }
 
     pub fn extract_key_from_url(&self, url_or_key: &str) -> String {
-        if !url_or_key.starts_with("http://") && !url_or_key.starts_with("https://") {
-            return url_or_key.to_string();
-        }
-        if !self.public_url_base.is_empty() && url_or_key.starts_with(&self.public_url_base) {
-            return url_or_key[self.public_url_base.len()..]
-                .trim_start_matches('/')
-                .to_string();
-        }
-        url_or_key.to_string()
+        key_from_public_url(&self.public_url_base, url_or_key)
+    }
+
+    /// Largest upload accepted for any media type; type-specific limits are
+    /// applied afterwards by `validate_image` / `validate_audio`.
+    pub fn max_upload_size_bytes(&self) -> u64 {
+        self.max_image_size_bytes.max(self.max_audio_size_bytes)
     }
 
     pub fn validate_image(&self, filename: &str, size: u64) -> Result<(), AppError> {
-        let ext = file_extension(filename).to_lowercase();
-        if !IMAGE_EXTENSIONS.contains(&ext.as_str()) {
+        if !has_extension(filename, IMAGE_EXTENSIONS) {
             return Err(AppError::bad_request(format!(
                 "Unsupported image format. Allowed: {}",
                 IMAGE_EXTENSIONS.join(", ")
@@ -142,8 +189,7 @@ impl StorageService {
     }
 
     pub fn validate_audio(&self, filename: &str, size: u64) -> Result<(), AppError> {
-        let ext = file_extension(filename).to_lowercase();
-        if !AUDIO_EXTENSIONS.contains(&ext.as_str()) {
+        if !has_extension(filename, AUDIO_EXTENSIONS) {
             return Err(AppError::bad_request(format!(
                 "Unsupported audio format. Allowed: {}",
                 AUDIO_EXTENSIONS.join(", ")
@@ -181,27 +227,99 @@ impl StorageService {
             .await
             .map_err(|e| AppError::service_unavailable(format!("Failed to read file: {e}")))?;
 
-        Ok((bytes.to_vec(), content_type))
+        Ok((Vec::from(bytes), content_type))
+    }
+}
+
+/// Map a public URL under `public_url_base` (no trailing slash) back to its
+/// object key, dropping any query string. Bare keys and URLs elsewhere are
+/// returned unchanged.
+fn key_from_public_url(public_url_base: &str, url_or_key: &str) -> String {
+    if !url_or_key.starts_with("http://") && !url_or_key.starts_with("https://") {
+        return url_or_key.to_string();
+    }
+    if public_url_base.is_empty() {
+        return url_or_key.to_string();
     }
+    // The base has no trailing slash, so the match must end on a path
+    // boundary or `https://cdn.x` would also match `https://cdn.xyz/...`
+    match url_or_key.strip_prefix(public_url_base) {
+        Some(rest) if rest.is_empty() || rest.starts_with(['/', '?', '#']) => {
+            let path = rest.split(['?', '#']).next().unwrap_or_default();
+            path.trim_start_matches('/').to_string()
+        }
+        _ => url_or_key.to_string(),
+    }
+}
+
+/// Extension including the dot (e.g. `.jpg`), borrowed from the filename;
+/// empty when there is none.
+pub fn file_extension(filename: &str) -> &str {
+    filename.rfind('.').map_or("", |i| &filename[i..])
 }
 
-pub fn file_extension(filename: &str) -> String {
-    filename
-        .rfind('.')
-        .map(|i| filename[i..].to_string())
-        .unwrap_or_default()
+/// Case-insensitive extension check without lowercasing a copy.
+fn has_extension(filename: &str, allowed: &[&str]) -> bool {
+    let ext = file_extension(filename);
+    allowed.iter().any(|e| e.eq_ignore_ascii_case(ext))
 }
 
 pub fn mime_from_extension(ext: &str) -> &'static str {
-    match ext.to_lowercase().as_str() {
-        ".jpg" | ".jpeg" => "image/jpeg",
-        ".png" => "image/png",
-        ".gif" => "image/gif",
-        ".webp" => "image/webp",
-        ".mp3" => "audio/mpeg",
-        ".m4a" => "audio/mp4",
-        ".wav" => "audio/wav",
-        ".ogg" => "audio/ogg",
-        _ => "application/octet-stream",
+    MIME_TYPES
+        .iter()
+        .find(|(e, _)| e.eq_ignore_ascii_case(ext))
+        .map_or("application/octet-stream", |&(_, mime)| mime)
+}
+
+#[cfg(test)]
+mod tests {
+    use super::*;
+
+    const BASE: &str = "https://cdn.example.com/bucket";
+
+    #[test]
+    fn bare_key_is_unchanged() {
+        assert_eq!(key_from_public_url(BASE, "uploads/a.jpg"), "uploads/a.jpg");
+    }
+
+    #[test]
+    fn exact_base_match_is_empty_key() {
+        assert_eq!(key_from_public_url(BASE, BASE), "");
+    }
+
+    #[test]
+    fn base_plus_key_yields_key() {
+        let url = format!("{BASE}/uploads/a.jpg");
+        assert_eq!(key_from_public_url(BASE, &url), "uploads/a.jpg");
+    }
+
+    #[test]
+    fn base_prefix_of_another_path_or_host_is_not_a_match() {
+        let other_bucket = "https://cdn.example.com/bucket2/x";
+        assert_eq!(key_from_public_url(BASE, other_bucket), other_bucket);
+
+        let other_host = "https://cdn.example.community/bucket/x";
+        assert_eq!(
+            key_from_public_url("https://cdn.example.com", other_host),
+            other_host
+        );
+    }
+
+    #[test]
+    fn query_string_is_dropped_from_key() {
+        let url = format!("{BASE}/uploads/a.jpg?X-Amz-Signature=abc&v=2");
+        assert_eq!(key_from_public_url(BASE, &url), "uploads/a.jpg");
+    }
+
+    #[test]
+    fn unrelated_url_is_unchanged() {
+        let url = "https://images.example.org/a.jpg?size=large";
+        assert_eq!(key_from_public_url(BASE, url), url);
+    }
+
+    #[test]
+    fn empty_base_leaves_urls_unchanged() {
+        let url = format!("{BASE}/uploads/a.jpg");
+        assert_eq!(key_from_public_url("", &url), url);
     }
 }
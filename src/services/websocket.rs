@@ -1,8 +1,37 @@
 use std::sync::atomic::{AtomicU64, Ordering};
 
 use dashmap::DashMap;
+use serde::Serialize;
 use tokio::sync::mpsc;
 
+#[derive(Serialize)]
+struct WsEvent<T> {
+    event: &'static str,
+    data: T,
+}
+
+#[derive(Serialize)]
+struct NewMessageData<'a, M, I> {
+    conversation_id: &'a str,
+    message: &'a M,
+    influencer: &'a I,
+    unread_count: i64,
+}
+
+#[derive(Serialize)]
+struct ConversationReadData<'a> {
+    conversation_id: &'a str,
+    unread_count: i64,
+    read_at: &'a str,
+}
+
+#[derive(Serialize)]
+struct TypingStatusData<'a> {
+    conversation_id: &'a str,
+    influencer_id: &'a str,
+    is_typing: bool,
+}
+
 static CONN_COUNTER: AtomicU64 = AtomicU64::new(0);
 
 pub type WsSender = mpsc::UnboundedSender<String>;
@@ -59,36 +88,48 @@ impl WsManager {
         }
     }
 
+    /// Serialize an event straight from borrowed data and send it. Skips the
+    /// serialization entirely when the user has no open connection.
+    fn send_event<T: Serialize>(&self, user_id: &str, event: &'static str, data: T) {
+        if !self.connections.contains_key(user_id) {
+            return;
+        }
+        match serde_json::to_string(&WsEvent { event, data }) {
+            Ok(message) => self.send_to_user(user_id, &message),
+            Err(e) => tracing::error!(error = %e, event, "Failed to serialize WebSocket event"),
+        }
+    }
+
     pub fn broadcast_new_message(
         &self,
         user_id: &str,
         conversation_id: &str,
-        message: &serde_json::Value,
-        influencer: &serde_json::Value,
+        message: &impl Serialize,
+        influencer: &impl Serialize,
         unread_count: i64,
     ) {
-        let event = serde_json::json!({
-            "event": "new_message",
-            "data": {
-                "conversation_id": conversation_id,
-                "message": message,
-                "influencer": influencer,
-                "unread_count": unread_count,
-            }
-        });
-        self.send_to_user(user_id, &event.to_string());
+        self.send_event(
+            user_id,
+            "new_message",
+            NewMessageData {
+                conversation_id,
+                message,
+                influencer,
+                unread_count,
+            },
+        );
     }
 
     pub fn broadcast_conversation_read(&self, user_id: &str, conversation_id: &str, read_at: &str) {
-        let event = serde_json::json!({
-            "event": "conversation_read",
-            "data": {
-                "conversation_id": conversation_id,
-                "unread_count": 0,
-                "read_at": read_at,
-            }
-        });
-        self.send_to_user(user_id, &event.to_string());
+        self.send_event(
+            user_id,
+            "conversation_read",
+            ConversationReadData {
+                conversation_id,
+                unread_count: 0,
+                read_at,
+            },
+        );
     }
 
     pub fn broadcast_typing_status(
@@ -98,14 +139,14 @@ impl WsManager {
         influencer_id: &str,
         is_typing: bool,
     ) {
-        let event = serde_json::json!({
-            "event": "typing_status",
-            "data": {
-                "conversation_id": conversation_id,
-                "influencer_id": influencer_id,
-                "is_typing": is_typing,
-            }
-        });
-        self.send_to_user(user_id, &event.to_string());
+        self.send_event(
+            user_id,
+            "typing_status",
+            TypingStatusData {
+                conversation_id,
+                influencer_id,
+                is_typing,
+            },
+        );
     }
 }